@@ -1,30 +1,19 @@
 import tkinter as tk
-from tkinter import messagebox
-import json
-import re
-import random
-
-class Subject:
-    def __init__(self, name):
-        self.id = name
-        self.name = name
-        self.mark = random.randint(25, 100)
-        self.grade = self.assign_grade(self.mark)
+from tkinter import messagebox, ttk
+import io
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
 
-    @staticmethod
-    def assign_grade(mark):
-        if mark >= 90:
-            return 'A'
-        elif mark >= 80:
-            return 'B'
-        elif mark >= 70:
-            return 'C'
-        elif mark >= 60:
-            return 'D'
-        elif mark >= 50:
-            return 'E'
-        else:
-            return 'F'
+import CLIUniApp_gp4Cmp1 as uniapp
+
+# How often the Tk thread looks for finished storage work.
+POLL_MS = 50
+
+# Rows fetched from the store per admin page; the Treeview never holds more.
+ADMIN_PAGE_SIZE = 50
+ADMIN_COLUMNS = (('id', "ID", 70), ('name', "Name", 110), ('email', "Email", 150), ('mark', "Mark", 45), ('grade', "Grade", 45))
+GRADE_FILTERS = {'All': None, 'Pass': uniapp.GRADES[:-1], 'Fail': 'F', **{grade: grade for grade in uniapp.GRADES}}
 
 class App:
     def __init__(self):
@@ -34,12 +23,77 @@ class App:
         self.root.configure(bg="#eeba30")
         self.current_student = None
 
+        # Storage and password checks run one at a time on this worker, so
+        # the event loop never waits on them. Finished work is picked up by
+        # poll_storage on the Tk thread, since Tk must not be called from
+        # the worker.
+        self.storage = ThreadPoolExecutor(max_workers=1)
+        self.finished = queue.Queue()
+        self.pending = 0
+
+        # Every screen is built once and stacked in the same place; moving
+        # between screens just raises one, so nothing is destroyed or rebuilt.
+        self.screens = {}
+        for name, build in (('login', self.build_login), ('home', self.build_home),
+                            ('enrollment', self.build_enrollment), ('subjects', self.build_subjects),
+                            ('admin', self.build_admin)):
+            screen = tk.Frame(self.root, bg="#eeba30")
+            screen.place(relx=0, rely=0, relwidth=1, relheight=1)
+            build(screen)
+            self.screens[name] = screen
+
+        self.busy_bar = ttk.Progressbar(self.root, mode='indeterminate')
+
         self.login_window()
 
-    def login_window(self):
-        self.clear_window()
-        
-        box = tk.LabelFrame(self.root, text='SIGN IN', bg="#eeba30", fg='#372e29', padx=20, pady=20, font='Helvetica 12 bold')
+    def show_screen(self, name):
+        self.screens[name].tkraise()
+        if self.pending:
+            self.busy_bar.tkraise()
+
+    def run_in_background(self, work, done):
+        # Run work() on the storage worker and hand its result to done() on
+        # the Tk thread. Errors are shown instead of passed on.
+        def job():
+            try:
+                self.finished.put((done, work(), None))
+            except Exception as e:
+                self.finished.put((done, None, e))
+
+        self.pending += 1
+        if self.pending == 1:
+            self.set_busy(True)
+            self.root.after(POLL_MS, self.poll_storage)
+        self.storage.submit(job)
+
+    def poll_storage(self):
+        while True:
+            try:
+                done, result, error = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if not self.pending:
+                self.set_busy(False)
+            if error is not None:
+                messagebox.showerror("Error", f"Could not reach the student store: {error}")
+            else:
+                done(result)
+        if self.pending:
+            self.root.after(POLL_MS, self.poll_storage)
+
+    def set_busy(self, busy):
+        if busy:
+            self.busy_bar.place(relx=0.5, rely=0.98, relwidth=0.8, anchor='s')
+            self.busy_bar.tkraise()
+            self.busy_bar.start(10)
+        else:
+            self.busy_bar.stop()
+            self.busy_bar.place_forget()
+        self.root.configure(cursor="watch" if busy else "")
+
+    def build_login(self, screen):
+        box = tk.LabelFrame(screen, text='SIGN IN', bg="#eeba30", fg='#372e29', padx=20, pady=20, font='Helvetica 12 bold')
         box.columnconfigure(0, weight=1)
         box.columnconfigure(1, weight=3)
         box.place(rely=0.5, relx=0.5, anchor='center')
@@ -53,7 +107,6 @@ class App:
         self.emailText = tk.StringVar()
         self.emailField = tk.Entry(box, textvariable=self.emailText)
         self.emailField.grid(column=1, row=0, padx=5, pady=5)
-        self.emailField.focus()
 
         self.passwordTxt = tk.StringVar()
         self.passwordField = tk.Entry(box, textvariable=self.passwordTxt, show="*")
@@ -65,46 +118,40 @@ class App:
         cancelBtn = tk.Button(box, text='Cancel')
         cancelBtn.grid(column=1, row=2, sticky=tk.E, padx=5, pady=5)
 
+        adminBtn = tk.Button(box, text='Admin', command=self.admin_window)
+        adminBtn.grid(column=1, row=3, sticky=tk.W, padx=5, pady=5)
+
+    def login_window(self):
+        self.emailText.set("")
+        self.passwordTxt.set("")
+        self.show_screen('login')
+        self.emailField.focus()
+
     def login(self):
+        if self.pending:
+            return
         email = self.emailField.get()
         password = self.passwordField.get()
+        # One lookup in the shared store, which also upgrades an old password
+        # hash, instead of parsing students.data once to check the email and
+        # again to check the password.
+        self.run_in_background(lambda: uniapp.authenticate(email, password), self.finish_login)
 
-        if not self.student_exists(email):  # Call the student_exists function as an instance method
-            messagebox.showerror("Error", "Invalid login credentials.")
-            return
-
-        with open("students.data", "r") as file:
-            students = json.load(file)
-
-        student = next((s for s in students if s['email'] == email and s['password'] == password), None)  # Find student by email and password
-
+    def finish_login(self, student):
         if student:
             self.current_student = student
             self.home_window()
         else:
             messagebox.showerror("Error", "Invalid login credentials.")
 
-    def student_exists(self, email):
-        try:
-            with open("students.data", "r") as file:
-                students = json.load(file)
-            for student in students:
-                if isinstance(student, dict) and student.get('email') == email:
-                    return True
-            return False
-        except (json.JSONDecodeError, FileNotFoundError):
-            return False
-    
-    def home_window(self):
-        self.clear_window()
-
-        welcome_label = tk.Label(self.root, text="Welcome to UniApp", bg="#eeba30", fg='#372e29', font='Helvetica 16 bold')
+    def build_home(self, screen):
+        welcome_label = tk.Label(screen, text="Welcome to UniApp", bg="#eeba30", fg='#372e29', font='Helvetica 16 bold')
         welcome_label.pack(pady=20)
 
-        select_label = tk.Label(self.root, text="Please select:", bg="#eeba30", fg='#372e29', font='Helvetica 14')
+        select_label = tk.Label(screen, text="Please select:", bg="#eeba30", fg='#372e29', font='Helvetica 14')
         select_label.pack(pady=10)
 
-        button_box = tk.Frame(self.root, bg="#eeba30")
+        button_box = tk.Frame(screen, bg="#eeba30")
         button_box.pack(pady=20)
 
         enroll_button = tk.Button(button_box, text="Enroll", command=self.enrollment_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
@@ -116,19 +163,20 @@ class App:
         logout_button = tk.Button(button_box, text="Logout", command=self.logout, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         logout_button.pack(side="top", pady=5)
 
-    def enrollment_window(self):
-        self.clear_window()
+    def home_window(self):
+        self.show_screen('home')
 
-        subject_name_label = tk.Label(self.root, text="Please enter the subject you want to enroll", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+    def build_enrollment(self, screen):
+        subject_name_label = tk.Label(screen, text="Please enter the subject you want to enroll", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         subject_name_label.pack(pady=20)
 
-        subject_name_frame = tk.Frame(self.root, bg="#eeba30")
+        subject_name_frame = tk.Frame(screen, bg="#eeba30")
         subject_name_frame.pack(pady=10)
 
         self.subject_entry = tk.Entry(subject_name_frame)
         self.subject_entry.pack(side="left", padx=5)
 
-        button_box = tk.Frame(self.root, bg="#eeba30")
+        button_box = tk.Frame(screen, bg="#eeba30")
         button_box.pack(pady=20)
 
         enroll_button = tk.Button(button_box, text="Enroll", command=self.enroll_subject, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
@@ -140,47 +188,73 @@ class App:
         back_to_home_button = tk.Button(button_box, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         back_to_home_button.pack(side="left", padx=5)
 
+    def enrollment_window(self):
+        self.clear_subject_entry()
+        self.show_screen('enrollment')
+        self.subject_entry.focus()
+
     def clear_subject_entry(self):
         self.subject_entry.delete(0, tk.END)
 
     def enroll_subject(self):
+        if self.pending:
+            return
         subject_name = self.subject_entry.get()
 
         if not subject_name:
             messagebox.showerror("Error", "Please enter a subject name.")
             return
 
-        subject = Subject(subject_name)
-
-        if 'subjects' not in self.current_student:
-            self.current_student['subjects'] = []
-
-        if len(self.current_student['subjects']) >= 4:
+        if len(self.current_student.get('subjects', [])) >= 4:
             # Check if the maximum number of subjects has been reached
             messagebox.showerror("Error", "Cannot enroll in more than 4 subjects.")
             return
-        
-        self.current_student['subjects'].append(subject.__dict__)
-
-        # Load all students
-        with open("students.data", "r") as file:
-            students = json.load(file)
-        
-        # Update current student in the list
-        for i, student in enumerate(students):
-            if student['email'] == self.current_student['email']:
-                students[i] = self.current_student
-                break
 
-        # Save all students back to the file
-        with open("students.data", "w") as file:
-            json.dump(students, file)
+        email = self.current_student['email']
+        self.run_in_background(lambda: self.store_enrollment(email, subject_name),
+                               lambda outcome: self.finish_enrollment(subject_name, *outcome))
 
-        messagebox.showinfo("Success", f"Subject '{subject_name}' enrolled successfully.")
+    @staticmethod
+    def store_enrollment(email, subject_name):
+        # Runs on the storage worker, against the latest stored copy, so an
+        # enrolment saved by another session since login is kept.
+        record = uniapp.repository.get_by_email(email)
+        if record is None:
+            return None, "Student no longer exists."
+        student = uniapp.Student(**record)
+        if len(student.subjects) >= 4:
+            return record, "Cannot enroll in more than 4 subjects."
+        if any(subject.name == subject_name for subject in student.subjects):
+            return record, "Subject already enrolled."
+        with redirect_stdout(io.StringIO()):
+            student.enroll_subject(subject_name)
+            student = uniapp.update_student_data(student, lambda latest: latest.enroll_subject(subject_name))
+        return student.to_dict(), None
+
+    def finish_enrollment(self, subject_name, record, error):
+        if record is not None:
+            self.current_student = record
+        if error:
+            messagebox.showerror("Error", error)
+        else:
+            messagebox.showinfo("Success", f"Subject '{subject_name}' enrolled successfully.")
+
+    def build_subjects(self, screen):
+        # One Treeview holds the whole list; showing it again only swaps the
+        # rows, never the widgets.
+        self.subject_list = ttk.Treeview(screen, columns=('subject', 'mark', 'grade'), show='headings', height=8)
+        self.subject_list.heading('subject', text="Subject")
+        self.subject_list.heading('mark', text="Mark")
+        self.subject_list.heading('grade', text="Grade")
+        self.subject_list.column('subject', width=200, anchor="w")
+        self.subject_list.column('mark', width=80, anchor="center")
+        self.subject_list.column('grade', width=80, anchor="center")
+        self.subject_list.pack(pady=30, padx=20, fill=tk.BOTH, expand=True)
+
+        back_button = tk.Button(screen, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        back_button.pack(pady=20)
 
     def show_subjects(self):
-        self.clear_window()
-
         subjects = self.current_student.get('subjects', [])
 
         if not subjects:
@@ -190,38 +264,130 @@ class App:
                 self.enrollment_window()
             return
 
-        subject_list = tk.Listbox(self.root, width=40)
-        subject_list.pack(pady=30)
-
+        self.subject_list.delete(*self.subject_list.get_children())
         for subject in subjects:
-            subject_text = f"Subject: {subject['name']}"
-            mark_text = f"Mark: {subject['mark']}"
-            grade_text = f"Grade: {subject['grade']}"
+            self.subject_list.insert('', tk.END, values=(subject['name'], subject['mark'], subject['grade']))
+        self.show_screen('subjects')
+
+    def build_admin(self, screen):
+        # The roster is browsed a page at a time: filtering and sorting
+        # happen in the store, and the Treeview only ever holds one page.
+        self.admin_query = {'subject': None, 'grades': None, 'sort': None, 'descending': False}
+        self.admin_offset = 0
+        self.admin_total = 0
+
+        title_label = tk.Label(screen, text="Students", bg="#eeba30", fg='#372e29', font='Helvetica 16 bold')
+        title_label.pack(pady=10)
+
+        filter_box = tk.Frame(screen, bg="#eeba30")
+        filter_box.pack(pady=5)
+
+        subject_label = tk.Label(filter_box, text="Subject:", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        subject_label.grid(column=0, row=0, padx=5, pady=5, sticky=tk.W)
+        self.admin_subject = tk.Entry(filter_box, width=15)
+        self.admin_subject.grid(column=1, row=0, padx=5, pady=5)
+
+        grade_label = tk.Label(filter_box, text="Grade:", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        grade_label.grid(column=0, row=1, padx=5, pady=5, sticky=tk.W)
+        self.admin_grade = ttk.Combobox(filter_box, values=list(GRADE_FILTERS), state='readonly', width=12)
+        self.admin_grade.set('All')
+        self.admin_grade.grid(column=1, row=1, padx=5, pady=5)
+
+        apply_button = tk.Button(filter_box, text="Apply", command=self.apply_admin_filters, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        apply_button.grid(column=2, row=0, rowspan=2, padx=5, pady=5)
 
-            subject_label = tk.Label(subject_list, text=subject_text, anchor="w")
-            subject_label.pack(fill=tk.X, expand=True)
+        self.admin_list = ttk.Treeview(screen, columns=[column for column, _, _ in ADMIN_COLUMNS], show='headings', height=20)
+        for column, heading, width in ADMIN_COLUMNS:
+            self.admin_list.heading(column, text=heading, command=lambda column=column: self.sort_admin(column))
+            self.admin_list.column(column, width=width, anchor="w" if column in ('name', 'email') else "center")
+        self.admin_list.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
 
-            mark_label = tk.Label(subject_list, text=mark_text, anchor="w")
-            mark_label.pack(fill=tk.X, expand=True)
+        page_box = tk.Frame(screen, bg="#eeba30")
+        page_box.pack(pady=5)
 
-            grade_label = tk.Label(subject_list, text=grade_text, anchor="w")
-            grade_label.pack(fill=tk.X, expand=True)
+        previous_button = tk.Button(page_box, text="< Previous", command=lambda: self.turn_admin_page(-1), bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        previous_button.pack(side="left", padx=5)
 
-            subject_list.pack(fill=tk.BOTH, expand=True)
+        self.admin_page_label = tk.Label(page_box, bg="#eeba30", fg='#372e29', font='Helvetica 12')
+        self.admin_page_label.pack(side="left", padx=5)
 
-        back_button = tk.Button(self.root, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        next_button = tk.Button(page_box, text="Next >", command=lambda: self.turn_admin_page(1), bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        next_button.pack(side="left", padx=5)
+
+        back_button = tk.Button(screen, text="Back", command=self.login_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         back_button.pack(pady=20)
-  
+
+    def admin_window(self):
+        self.show_screen('admin')
+        self.fetch_admin_page()
+
+    def apply_admin_filters(self):
+        if self.pending:
+            return
+        subject = self.admin_subject.get().strip() or None
+        self.admin_query['subject'] = subject
+        self.admin_query['grades'] = GRADE_FILTERS[self.admin_grade.get()]
+        if subject is None and self.admin_query['sort'] in ('mark', 'grade'):
+            self.admin_query['sort'] = None
+            self.admin_query['descending'] = False
+        self.admin_offset = 0
+        self.fetch_admin_page()
+
+    def sort_admin(self, column):
+        # Clicking the sorted column again reverses it.
+        if self.pending:
+            return
+        if column in ('mark', 'grade') and self.admin_query['subject'] is None:
+            messagebox.showerror("Error", "Enter a subject to sort by mark or grade.")
+            return
+        if self.admin_query['sort'] == column:
+            self.admin_query['descending'] = not self.admin_query['descending']
+        else:
+            self.admin_query['sort'] = column
+            self.admin_query['descending'] = False
+        self.admin_offset = 0
+        self.fetch_admin_page()
+
+    def turn_admin_page(self, step):
+        if self.pending:
+            return
+        offset = self.admin_offset + step * ADMIN_PAGE_SIZE
+        if 0 <= offset < self.admin_total:
+            self.admin_offset = offset
+            self.fetch_admin_page()
+
+    def fetch_admin_page(self):
+        query = dict(self.admin_query, offset=self.admin_offset, limit=ADMIN_PAGE_SIZE)
+        self.run_in_background(lambda: uniapp.repository.query_students(**query), self.show_admin_page)
+
+    def show_admin_page(self, page):
+        self.admin_total, rows = page
+        self.admin_list.delete(*self.admin_list.get_children())
+        for row in rows:
+            self.admin_list.insert('', tk.END, values=tuple(row.get(column, "") for column, _, _ in ADMIN_COLUMNS))
+
+        for column, heading, _ in ADMIN_COLUMNS:
+            if column == self.admin_query['sort']:
+                heading += " \u25bc" if self.admin_query['descending'] else " \u25b2"
+            self.admin_list.heading(column, text=heading)
+
+        if not self.admin_total:
+            self.admin_page_label.configure(text="<Nothing to display>")
+        else:
+            pages = -(-self.admin_total // ADMIN_PAGE_SIZE)
+            self.admin_page_label.configure(
+                text=f"Page {self.admin_offset // ADMIN_PAGE_SIZE + 1} of {pages} ({self.admin_total} students)")
+
     def logout(self):
         self.current_student = None
         self.login_window()
 
-    def clear_window(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
-
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            # Let a save that is already under way finish.
+            self.storage.shutdown(wait=True)
 
 
 app = App()
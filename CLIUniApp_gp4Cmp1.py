@@ -1,30 +1,104 @@
+import argparse
+import csv
+import gc
+import hashlib
+import hmac
+import io
 import json
+import math
+import mmap
 import os
-import re
 import random
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 from pathlib import Path
 
+import validation
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+GRADES = 'ABCDEF'
+GRADE_CODES = {grade: code for code, grade in enumerate(GRADES)}
+
+def check_grade_boundaries(boundaries):
+    # Boundaries are the lowest mark for E, D, C, B and A (anything below the
+    # first is an F): one per passing grade, strictly ascending. Returns them
+    # as a tuple, or raises ValueError.
+    boundaries = tuple(boundaries)
+    if (len(boundaries) != len(GRADES) - 1
+            or not all(isinstance(mark, (int, float)) and not isinstance(mark, bool) for mark in boundaries)
+            or any(low >= high for low, high in zip(boundaries, boundaries[1:]))):
+        raise ValueError(f"Grade boundaries must be {len(GRADES) - 1} strictly ascending marks, "
+                         f"the lowest for {', '.join(reversed(GRADES[:-1]))}; got {boundaries}")
+    return boundaries
+
+def _boundaries_from_env(text):
+    try:
+        return check_grade_boundaries(int(mark) for mark in text.split(","))
+    except ValueError as e:
+        raise ValueError(f"Invalid UNIAPP_GRADE_BOUNDARIES {text!r}: {e}") from None
+
+GRADE_BOUNDARIES = _boundaries_from_env(os.environ.get("UNIAPP_GRADE_BOUNDARIES", "50,60,70,80,90"))
+
+PASSWORD_SCHEME = "pbkdf2_sha256"
+# PBKDF2 rounds for newly hashed passwords. Stored hashes keep the count they
+# were made with and are upgraded on the next successful login.
+PASSWORD_ITERATIONS = int(os.environ.get("UNIAPP_PASSWORD_ITERATIONS", "200000"))
+LOGIN_CACHE_SIZE = int(os.environ.get("UNIAPP_LOGIN_CACHE_SIZE", "1024"))
+
+def assign_grades(marks, boundaries=GRADE_BOUNDARIES):
+    # Grade a whole column of marks in one pass, returning an array of grade
+    # codes (indexes into GRADES).
+    if boundaries is not GRADE_BOUNDARIES:
+        boundaries = check_grade_boundaries(boundaries)
+    top = len(boundaries)
+    if numpy is not None:
+        codes = top - numpy.searchsorted(numpy.asarray(boundaries), numpy.asarray(marks), side='right')
+        return array('B', codes.astype(numpy.uint8).tobytes())
+    return array('B', [top - bisect_right(boundaries, mark) for mark in marks])
+
 class Subject:
+    __slots__ = ('id', 'name', 'mark', '_grade')
+
     def __init__(self, name, id=None, mark=None, grade=None):
-        self.id = id if id is not None else str(random.randint(1, 999)).zfill(3)
+        # Subject ids are scoped to a student; Student assigns one when the
+        # subject is enrolled.
+        self.id = id
         self.name = name
         self.mark = mark if mark is not None else random.randint(25, 100)
         self.grade = grade if grade is not None else self.assign_grade(self.mark)
 
+    @property
+    def grade(self):
+        return GRADES[self._grade]
+
+    @grade.setter
+    def grade(self, grade):
+        self._grade = GRADE_CODES[grade]
+
     @staticmethod
-    def assign_grade(mark):
-        if mark >= 90:
-            return 'A'
-        elif mark >= 80:
-            return 'B'
-        elif mark >= 70:
-            return 'C'
-        elif mark >= 60:
-            return 'D'
-        elif mark >= 50:
-            return 'E'
-        else:
-            return 'F'
+    def assign_grade(mark, boundaries=GRADE_BOUNDARIES):
+        if boundaries is not GRADE_BOUNDARIES:
+            boundaries = check_grade_boundaries(boundaries)
+        return GRADES[len(boundaries) - bisect_right(boundaries, mark)]
 
     def to_dict(self):
         return {
@@ -35,33 +109,101 @@ class Subject:
         }
 
 class Student:
-    def __init__(self, id=None, name=None, email=None, password=None, subjects=None):
-        self.id = id if id is not None else str(random.randint(1, 999999)).zfill(6)
+    __slots__ = ('id', 'name', 'email', '_password', '_subject_records', '_subject_map', 'version', '_changed',
+                 '_last_subject_id')
+
+    def __init__(self, id=None, name=None, email=None, password=None, subjects=None, version=0,
+                 last_subject_id=None):
+        self.id = id if id is not None else repository.allocate_student_id()
         self.name = name
         self.email = email
-        self.password = password
-        self.subjects = [Subject(**subj) for subj in subjects] if subjects else []
+        self._password = password
+        # The stored subject dicts are only turned into Subjects when the
+        # subjects are first used, so e.g. a password change builds none.
+        self._subject_records = subjects or []
+        self._subject_map = None
+        self.version = version
+        # The highest subject id ever given out, so removing the newest
+        # subject does not free its id for the next enrolment. Only stored
+        # once it is ahead of the current subjects' ids.
+        self._last_subject_id = (last_subject_id if last_subject_id is not None
+                                 else self._highest_subject_id(self._subject_records))
+        # Names of the to_dict() fields changed since the student was loaded
+        # or last saved; empty means there is nothing to save.
+        self._changed = set()
+
+    @property
+    def dirty(self):
+        return bool(self._changed)
+
+    @property
+    def changed_fields(self):
+        return frozenset(self._changed)
+
+    def mark_clean(self):
+        self._changed.clear()
+
+    @property
+    def password(self):
+        return self._password
+
+    @password.setter
+    def password(self, password):
+        if password != self._password:
+            self._password = password
+            self._changed.add('password')
+
+    @property
+    def _subjects(self):
+        # Subject id -> Subject, in enrolment order.
+        if self._subject_map is None:
+            self._subject_map = {}
+            for subj in self._subject_records:
+                subject = Subject(**subj)
+                if subject.id is None or subject.id in self._subject_map:
+                    # Records written by the old random generator can repeat ids.
+                    subject.id = self._next_subject_id()
+                self._subject_map[subject.id] = subject
+            self._subject_records = None
+        return self._subject_map
+
+    @property
+    def subjects(self):
+        return list(self._subjects.values())
+
+    @staticmethod
+    def _highest_subject_id(subjects):
+        return max((int(subject['id']) for subject in subjects
+                    if isinstance(subject['id'], str) and subject['id'].isdigit()), default=0)
+
+    def _next_subject_id(self):
+        used = [int(subject_id) for subject_id in self._subjects if subject_id.isdigit()]
+        self._last_subject_id = max(used + [self._last_subject_id]) + 1
+        return str(self._last_subject_id).zfill(3)
 
     def enroll_subject(self, subject_name):
-        if len(self.subjects) >= 4:
+        if len(self._subjects) >= 4:
             print("\033[91mCannot enroll in more than 4 subjects.\033[0m")
-            return
+            return False
 
-        if any(subject.name == subject_name for subject in self.subjects):
+        if any(subject.name == subject_name for subject in self._subjects.values()):
             print("\033[91mSubject already enrolled.\033[0m")
-            return
+            return False
 
-        subject = Subject(name=subject_name)
-        self.subjects.append(subject)
+        subject = Subject(name=subject_name, id=self._next_subject_id())
+        self._subjects[subject.id] = subject
+        self._changed.add('subjects')
         print("\033[93mSubject enrolled successfully.\033[0m")
-        print(f"\033[93mYou are now enrolled in {len(self.subjects)} out of 4 subjects.\033[0m")
+        print(f"\033[93mYou are now enrolled in {len(self._subjects)} out of 4 subjects.\033[0m")
+        return True
 
     def remove_subject(self, subject_id):
-        if any(subject.id == subject_id for subject in self.subjects):
-            self.subjects = [subject for subject in self.subjects if subject.id != subject_id]
+        if self._subjects.pop(subject_id, None) is not None:
+            self._changed.add('subjects')
             print("\033[93mSubject removed successfully.\033[0m")
-        else:
-            print("\033[91mSubject not found.\033[0m")
+            return True
+        print("\033[91mSubject not found.\033[0m")
+        return False
 
     def show_subjects(self):
         if not self.subjects:
@@ -71,21 +213,23 @@ class Student:
         for subject in self.subjects:
             print(f"Subject ID: {subject.id}, Name: {subject.name}, Mark: {subject.mark:.2f}, Grade: {subject.grade}")
 
-    def change_password(self, new_password):
+    def change_password(self, new_password, confirm_password=None):
         # Check new password format
         if not validate_password(new_password):
             print("\033[91mInvalid password format, please try again.\033[0m")
-            return
+            return False
 
         # Confirm new password
-        confirm_password = input("Confirm new password: ")
+        if confirm_password is None:
+            confirm_password = input("Confirm new password: ")
         if confirm_password != new_password:
             print("\033[91mPassword does not match. Please try again.\033[0m")
-            return
+            return False
 
         # Update password
-        self.password = new_password
+        self.password = hash_password(new_password)
         print("\033[93mPassword updated successfully.\033[0m")
+        return True
 
     
     def calculate_average_mark(self):
@@ -97,39 +241,1492 @@ class Student:
         return self.calculate_average_mark() >= 50
 
     def to_dict(self):
-        return {
+        record = {
             'id': self.id,
             'name': self.name,
             'email': self.email,
             'password': self.password,
-            'subjects': [subject.to_dict() for subject in self.subjects]
+            'subjects': ([dict(subject) for subject in self._subject_records] if self._subject_map is None
+                         else [subject.to_dict() for subject in self._subject_map.values()]),
+            'version': self.version
         }
+        if self._last_subject_id > self._highest_subject_id(record['subjects']):
+            record['last_subject_id'] = self._last_subject_id
+        return record
+
+def _column(typecode, values):
+    # Pack a column into a typed array, falling back to floats for values
+    # that do not fit the compact typecode.
+    try:
+        return array(typecode, values)
+    except (TypeError, OverflowError):
+        return array('d', values)
+
+class RosterBatch:
+    # Column-oriented roster for bulk analytics: one list or typed array per
+    # field instead of one dict per record. Strings are shared with the
+    # source dicts rather than copied, and subject names are stored once in
+    # name_table. The subjects of student i are rows
+    # subject_offsets[i]:subject_offsets[i + 1] of the subject columns.
+    def __init__(self, ids, names, emails, passwords, versions, subject_offsets,
+                 subject_ids, subject_names, marks, grades, name_table):
+        self.ids = ids
+        self.names = names
+        self.emails = emails
+        self.passwords = passwords
+        self.versions = versions
+        self.subject_offsets = subject_offsets
+        self.subject_ids = subject_ids
+        self.subject_names = subject_names
+        self.marks = marks
+        self.grades = grades
+        self.name_table = name_table
+
+    @classmethod
+    def from_dicts(cls, students):
+        ids, names, emails, passwords, versions = [], [], [], [], []
+        offsets = [0]
+        subject_ids, subject_names, marks, grades = [], [], [], []
+        name_table = []
+        name_codes = {}
+        for student in students:
+            ids.append(student['id'])
+            names.append(student['name'])
+            emails.append(student['email'])
+            passwords.append(student['password'])
+            versions.append(student.get('version', 0))
+            for subject in student['subjects']:
+                code = name_codes.get(subject['name'])
+                if code is None:
+                    code = name_codes[subject['name']] = len(name_table)
+                    name_table.append(subject['name'])
+                subject_ids.append(subject['id'])
+                subject_names.append(code)
+                marks.append(subject['mark'])
+                grades.append(GRADE_CODES[subject['grade']])
+            offsets.append(len(subject_ids))
+        return cls(ids, names, emails, passwords, array('I', versions), array('I', offsets),
+                   subject_ids, _column('H', subject_names), _column('B', marks), array('B', grades),
+                   name_table)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        start, end = self.subject_offsets[index], self.subject_offsets[index + 1]
+        return {
+            'id': self.ids[index],
+            'name': self.names[index],
+            'email': self.emails[index],
+            'password': self.passwords[index],
+            'subjects': [{
+                'id': self.subject_ids[row],
+                'name': self.name_table[self.subject_names[row]],
+                'mark': self.marks[row],
+                'grade': GRADES[self.grades[row]]
+            } for row in range(start, end)],
+            'version': self.versions[index]
+        }
+
+    def to_dicts(self):
+        for index in range(len(self.ids)):
+            yield self[index]
+
+    def regrade(self, boundaries=GRADE_BOUNDARIES):
+        self.grades = assign_grades(self.marks, boundaries)
+
+    def grade_counts(self, subject_name):
+        counts = dict.fromkeys(GRADES, 0)
+        wanted = {code for code, name in enumerate(self.name_table) if name.lower() == subject_name.lower()}
+        for code, grade in zip(self.subject_names, self.grades):
+            if code in wanted:
+                counts[GRADES[grade]] += 1
+        return counts
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Atomic saves replace the file, so the inode changes even when mtime and
+    # size happen to match the previous write.
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+class FileLock:
+    # Reader/writer lock shared between processes via flock() on a sidecar
+    # file. Re-entrant within one thread; other threads of the process wait
+    # for it like other processes do. Between processes it is a no-op where
+    # fcntl is missing.
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+        self._exclusive = False
+        self._thread_lock = threading.RLock()
+
+    def shared(self):
+        return self._hold(exclusive=False)
+
+    def exclusive(self):
+        return self._hold(exclusive=True)
+
+    @contextmanager
+    def _hold(self, exclusive):
+        with self._thread_lock:
+            yield from self._hold_file(exclusive)
+
+    def _hold_file(self, exclusive):
+        upgraded = False
+        if fcntl is not None:
+            if self._depth == 0:
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._exclusive = exclusive
+            elif exclusive and not self._exclusive:
+                # flock upgrades are not atomic; callers that write should take
+                # the exclusive lock before reading.
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                self._exclusive = upgraded = True
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if fcntl is not None:
+                if self._depth == 0:
+                    self._file.close()
+                    self._file = None
+                elif upgraded:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_SH)
+                    self._exclusive = False
+
+def _umask():
+    # There is no way to read the umask without setting it.
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+@contextmanager
+def atomic_open(path, sync_directory=False, mode="w"):
+    # Write to a temp file next to `path`, fsync it and swap it into place,
+    # so readers only ever see the old file or the complete new one.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file 0600; give it the old file's mode, or what
+        # open() would have given a new file.
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        else:
+            os.chmod(temp_path, 0o666 & ~_umask())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    if sync_directory and hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    # Yield the items of a top-level JSON array one at a time, holding at most
+    # one chunk plus the current item in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != "[":
+                    raise json.JSONDecodeError("Expecting '['", buffer, position)
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                position = end
+                continue
+        elif eof:
+            if started:
+                raise json.JSONDecodeError("Unterminated array", buffer, position)
+            return
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+@contextmanager
+def paused_gc():
+    # A loaded roster is a large tree without cycles; pausing the cyclic
+    # collector while it is built saves repeated scans of it.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def split_json_array(text):
+    # Decode a top-level JSON array as json.loads would, returning (item,
+    # source text of the item) pairs.
+    decoder = json.JSONDecoder()
+    skip = JSON_WHITESPACE.match
+    position = skip(text).end()
+    if text[position:position + 1] != "[":
+        raise json.JSONDecodeError("Expecting '['", text, position)
+    position = skip(text, position + 1).end()
+    items = []
+    if text[position:position + 1] != "]":
+        while True:
+            item, end = decoder.raw_decode(text, position)
+            items.append((item, text[position:end]))
+            position = skip(text, end).end()
+            if text[position:position + 1] == "]":
+                break
+            if text[position:position + 1] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+            position = skip(text, position + 1).end()
+    end = skip(text, position + 1).end()
+    if end != len(text):
+        raise json.JSONDecodeError("Extra data", text, end)
+    return items
 
 class Database:
-    @staticmethod
-    def load_students():
-        if not os.path.exists("students.data") or os.path.getsize("students.data") == 0:
+    def __init__(self, path="students.data", sync_directory=False):
+        self.path = path
+        self.sync_directory = sync_directory
+        # id(record) -> (record, version, encoded text) for every record read
+        # or written last time. Records are replaced, never edited in place,
+        # so a save only has to encode the records that are new since.
+        self._encoded = {}
+
+    def load_students(self):
+        self._encoded = {}
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
             return []
         try:
-            with open("students.data", "r") as file:
-                return json.load(file)
+            with paused_gc(), open(self.path, "r") as file:
+                students = []
+                for student, text in split_json_array(file.read()):
+                    self._encoded[id(student)] = (student, student.get('version'), text)
+                    students.append(student)
+                return students
         except (json.JSONDecodeError, FileNotFoundError) as e:
+            self._encoded = {}
             print(f"Error loading students data: {e}")
             return []
 
+    def iter_students(self):
+        try:
+            with open(self.path, "r") as file:
+                yield from iter_json_array(file)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            print(f"Error loading students data: {e}")
+
+    def save_students(self, students):
+        # Byte-for-byte what json.dump(students, file, indent=4) writes, but
+        # unchanged records reuse the text they were read or last saved as.
+        encoded = {}
+        texts = []
+        for student in students:
+            cached = self._encoded.get(id(student))
+            if cached is None or cached[0] is not student or cached[1] != student.get('version'):
+                cached = (student, student.get('version'), json.dumps(student, indent=4).replace("\n", "\n    "))
+            encoded[id(student)] = cached
+            texts.append(cached[2])
+        with atomic_open(self.path, self.sync_directory) as file:
+            file.write("[\n    " + ",\n    ".join(texts) + "\n]" if texts else "[]")
+        self._encoded = encoded
+
+    def stamp(self):
+        return file_stamp(self.path)
+
+    def load_meta(self):
+        try:
+            with open(self.path + ".meta", "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_meta(self, meta):
+        with atomic_open(self.path + ".meta", self.sync_directory) as file:
+            json.dump(meta, file)
+
+    def clear(self):
+        open(self.path, 'w').close()
+
+class JournalDatabase(Database):
+    # students.data holds the last snapshot; every mutation since then is
+    # appended to the journal as one compact JSON line, so a single change
+    # costs the same no matter how large the roster is.
+    def __init__(self, path="students.data", journal_path=None, compact_threshold=1024 * 1024, sync_directory=False):
+        super().__init__(path, sync_directory)
+        self.journal_path = journal_path or path + ".journal"
+        self.compact_threshold = compact_threshold
+
+    def load_students(self):
+        students = {student['email']: student for student in super().load_students()}
+        for email, student in self._replay().items():
+            if student is None:
+                students.pop(email, None)
+            else:
+                students[email] = student
+        return list(students.values())
+
+    def iter_students(self):
+        # The journal is bounded by compact_threshold, so only it is held in
+        # memory while the snapshot is streamed past it.
+        changes = self._replay()
+        for student in super().iter_students():
+            if student['email'] in changes:
+                student = changes.pop(student['email'])
+                if student is None:
+                    continue
+            yield student
+        for student in changes.values():
+            if student is not None:
+                yield student
+
+    def _replay(self):
+        # Latest journal entry per email; None marks a deleted student.
+        changes = {}
+        try:
+            with open(self.journal_path, "r") as journal:
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn line from an interrupted append.
+                        continue
+                    if record['op'] == 'put':
+                        changes[record['student']['email']] = record['student']
+                    elif record['op'] == 'delete':
+                        changes[record['email']] = None
+        except FileNotFoundError:
+            pass
+        return changes
+
+    def save_students(self, students):
+        super().save_students(students)
+        open(self.journal_path, 'w').close()
+
+    def append(self, changes):
+        lines = []
+        for op, student, _ in changes:
+            if op == 'put':
+                record = {'op': 'put', 'student': student}
+            else:
+                record = {'op': 'delete', 'email': student['email']}
+            lines.append(json.dumps(record, separators=(',', ':')) + "\n")
+        with open(self.journal_path, "a+b") as journal:
+            self._drop_torn_tail(journal)
+            journal.write("".join(lines).encode())
+            journal.flush()
+            os.fsync(journal.fileno())
+
     @staticmethod
-    def save_students(students):
-        with open("students.data", "w") as file:
-            json.dump(students, file, indent=4)
+    def _drop_torn_tail(journal):
+        # An interrupted append can leave a last line without its newline.
+        # Replay skips it, but a record appended straight after would share
+        # its line and be skipped too, so cut it off first.
+        end = journal.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        journal.seek(end - 1)
+        if journal.read(1) == b"\n":
+            return
+        position = end
+        keep = 0
+        while position > 0:
+            start = max(position - 64 * 1024, 0)
+            journal.seek(start)
+            newline = journal.read(position - start).rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            position = start
+        journal.truncate(keep)
+
+    def needs_compaction(self):
+        try:
+            return os.path.getsize(self.journal_path) >= self.compact_threshold
+        except FileNotFoundError:
+            return False
+
+    def stamp(self):
+        return (file_stamp(self.path), file_stamp(self.journal_path))
+
+    def clear(self):
+        super().clear()
+        open(self.journal_path, 'w').close()
+
+class SQLiteDatabase(Database):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS students (
+            key INTEGER PRIMARY KEY,
+            id TEXT NOT NULL,
+            name TEXT,
+            email TEXT NOT NULL UNIQUE,
+            password TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            last_subject_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS students_by_id ON students (id);
+        CREATE TABLE IF NOT EXISTS subjects (
+            student_key INTEGER NOT NULL REFERENCES students (key) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            id TEXT,
+            name TEXT,
+            name_key TEXT,
+            mark INTEGER,
+            grade TEXT
+        );
+        CREATE INDEX IF NOT EXISTS subjects_by_student ON subjects (student_key, position);
+        CREATE INDEX IF NOT EXISTS subjects_by_name ON subjects (name_key, grade);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path="students.db"):
+        super().__init__(path)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA foreign_keys = ON")
+            self._connection.executescript(self.SCHEMA)
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(students)")]
+            if 'version' not in columns:
+                self._connection.execute("ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            if 'last_subject_id' not in columns:
+                self._connection.execute("ALTER TABLE students ADD COLUMN last_subject_id INTEGER")
+        return self._connection
 
     @staticmethod
-    def clear_database():
-        confirmation = input("\033[91mAre you sure you want to clear the database (YES)/(NO): \033[0m").upper()
-        if confirmation == 'YES':
-            open("students.data", 'w').close()
-            print("\033[93mStudents data cleared.\033[0m")
+    def _student(id, name, email, password, version, last_subject_id):
+        student = {'id': id, 'name': name, 'email': email, 'password': password, 'subjects': [],
+                   'version': version}
+        if last_subject_id is not None:
+            student['last_subject_id'] = last_subject_id
+        return student
+
+    def load_students(self):
+        students = {}
+        for key, *fields in self.connection.execute(
+                "SELECT key, id, name, email, password, version, last_subject_id FROM students ORDER BY key"):
+            students[key] = self._student(*fields)
+        for student_key, id, name, mark, grade in self.connection.execute(
+                "SELECT student_key, id, name, mark, grade FROM subjects ORDER BY student_key, position"):
+            students[student_key]['subjects'].append({'id': id, 'name': name, 'mark': mark, 'grade': grade})
+        return list(students.values())
+
+    def iter_students(self):
+        # Merge-join two cursors that share the student key order, so only
+        # one student is materialised at a time.
+        subjects = self.connection.execute(
+            "SELECT student_key, id, name, mark, grade FROM subjects ORDER BY student_key, position")
+        subject = next(subjects, None)
+        for key, *fields in self.connection.execute(
+                "SELECT key, id, name, email, password, version, last_subject_id FROM students ORDER BY key"):
+            student = self._student(*fields)
+            while subject is not None and subject[0] <= key:
+                if subject[0] == key:
+                    student['subjects'].append(
+                        {'id': subject[1], 'name': subject[2], 'mark': subject[3], 'grade': subject[4]})
+                subject = next(subjects, None)
+            yield student
+
+    def save_students(self, students):
+        with self.connection:
+            self.connection.execute("DELETE FROM subjects")
+            self.connection.execute("DELETE FROM students")
+            for student in students:
+                self._insert(student)
+
+    def append(self, changes):
+        with self.connection:
+            for op, student, fields in changes:
+                row = self.connection.execute("SELECT key FROM students WHERE email = ?", (student['email'],)).fetchone()
+                if op == 'delete':
+                    if row is not None:
+                        self.connection.execute("DELETE FROM students WHERE key = ?", row)
+                elif row is None:
+                    self._insert(student)
+                else:
+                    # Update in place so the student keeps its position in the roster.
+                    self.connection.execute(
+                        "UPDATE students SET id = ?, name = ?, password = ?, version = ?, last_subject_id = ? "
+                        "WHERE key = ?",
+                        (str(student['id']), student['name'], student['password'], student.get('version', 0),
+                         student.get('last_subject_id'), row[0]))
+                    if fields is None or 'subjects' in fields:
+                        self.connection.execute("DELETE FROM subjects WHERE student_key = ?", row)
+                        self._insert_subjects(row[0], student)
+
+    def _insert(self, student):
+        cursor = self.connection.execute(
+            "INSERT INTO students (id, name, email, password, version, last_subject_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(student['id']), student['name'], student['email'], student['password'], student.get('version', 0),
+             student.get('last_subject_id')))
+        self._insert_subjects(cursor.lastrowid, student)
+
+    def _insert_subjects(self, student_key, student):
+        self.connection.executemany(
+            "INSERT INTO subjects (student_key, position, id, name, name_key, mark, grade) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(student_key, position, subject['id'], subject['name'], subject['name'].lower(),
+              subject['mark'], subject['grade'])
+             for position, subject in enumerate(student['subjects'])])
+
+    def needs_compaction(self):
+        return False
+
+    def load_meta(self):
+        return {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM meta")}
+
+    def save_meta(self, meta):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                        [(key, json.dumps(value)) for key, value in meta.items()])
+
+    def stamp(self):
+        # data_version moves whenever another connection commits, which the
+        # file's mtime alone can miss.
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        return (file_stamp(self.path), data_version)
+
+    def group_students(self, subject_name, grades=None):
+        # One row per student, from their first enrolment in the subject as
+        # in partition_students; the grade filter applies to that enrolment.
+        rows = self.connection.execute(
+            "SELECT students.id, students.name, subjects.grade, MIN(subjects.position) FROM subjects "
+            "JOIN students ON students.key = subjects.student_key "
+            "WHERE subjects.name_key = ? GROUP BY subjects.student_key ORDER BY subjects.student_key",
+            (subject_name.lower(),)).fetchall()
+        if not rows:
+            return None
+        grade_groups = {}
+        for id, name, grade, _ in rows:
+            if grades is None or grade in grades:
+                grade_groups.setdefault(grade, []).append({'id': id, 'name': name})
+        return {grade: grade_groups[grade] for grade in sorted(grade_groups)}
+
+    def partition_students(self, subject_name):
+        # SQLite returns the bare columns from the row holding MIN(position),
+        # i.e. the student's first enrolment in the subject.
+        rows = self.connection.execute(
+            "SELECT students.id, students.name, subjects.grade, MIN(subjects.position) FROM subjects "
+            "JOIN students ON students.key = subjects.student_key "
+            "WHERE subjects.name_key = ? GROUP BY subjects.student_key ORDER BY subjects.student_key",
+            (subject_name.lower(),)).fetchall()
+        if not rows:
+            return None
+        pass_students = []
+        fail_students = []
+        for id, name, grade, _ in rows:
+            (pass_students if grade != 'F' else fail_students).append({'id': id, 'name': name})
+        return pass_students, fail_students
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM subjects")
+            self.connection.execute("DELETE FROM students")
+
+# Binary snapshot layout, all integers little-endian:
+#   header       magic, format version, student count and the offsets of the
+#                three tables below
+#   records      per student: u32 length, then the record (see _encode_record)
+#   strings      u32 count, then u16 length + UTF-8 bytes per subject name
+#   offsets      u64 file offset of each record, in roster order
+#   email index  u32 record number of each record, in email order
+SNAPSHOT_MAGIC = b"UNIAPPSN"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHxxIQQQ")
+SNAPSHOT_RECORD = struct.Struct("<BIHHHHB")
+SNAPSHOT_SUBJECT = struct.Struct("<HIBBd")
+SNAPSHOT_FIELDS = ['id', 'name', 'email', 'password', 'subjects', 'version']
+SNAPSHOT_SUBJECT_FIELDS = ['id', 'name', 'mark', 'grade']
+SNAPSHOT_STRUCTURED, SNAPSHOT_JSON = 0, 1
+SNAPSHOT_NONE = 0xFFFF
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+def _snapshot_string(value):
+    if value is None:
+        return b""
+    if not isinstance(value, str):
+        raise ValueError(value)
+    data = value.encode()
+    if len(data) >= SNAPSHOT_NONE:
+        raise ValueError(value)
+    return data
+
+def _encode_record(student, names):
+    # The common record shape is packed field by field, with subject names
+    # stored once in the string table. Anything else (extra keys, unusual
+    # types) is kept as JSON so every record survives a round trip exactly.
+    try:
+        if list(student) != SNAPSHOT_FIELDS or not 0 <= student['version'] < 2 ** 32 \
+                or len(student['subjects']) > 255:
+            raise ValueError(student)
+        strings = [_snapshot_string(student[field]) for field in ('id', 'name', 'email', 'password')]
+        parts = [SNAPSHOT_RECORD.pack(SNAPSHOT_STRUCTURED, student['version'],
+                                      *[SNAPSHOT_NONE if student[field] is None else len(data)
+                                        for field, data in zip(('id', 'name', 'email', 'password'), strings)],
+                                      len(student['subjects']))]
+        parts.extend(strings)
+        for subject in student['subjects']:
+            mark = subject['mark']
+            if list(subject) != SNAPSHOT_SUBJECT_FIELDS or not isinstance(subject['name'], str) \
+                    or subject['grade'] not in GRADE_CODES or type(mark) not in (int, float) \
+                    or (type(mark) is int and abs(mark) >= 2 ** 53):
+                raise ValueError(subject)
+            subject_id = _snapshot_string(subject['id'])
+            _snapshot_string(subject['name'])
+            name = names.setdefault(subject['name'], len(names))
+            parts.append(SNAPSHOT_SUBJECT.pack(SNAPSHOT_NONE if subject['id'] is None else len(subject_id), name,
+                                               GRADE_CODES[subject['grade']], type(mark) is float, mark))
+            parts.append(subject_id)
+        return b"".join(parts)
+    except (ValueError, TypeError, KeyError):
+        return bytes([SNAPSHOT_JSON]) + json.dumps(student, separators=(',', ':')).encode()
+
+def write_snapshot(path, students, sync_directory=False):
+    names = {}
+    offsets = []
+    emails = []
+    with atomic_open(path, sync_directory, mode="wb") as file:
+        file.write(bytes(SNAPSHOT_HEADER.size))
+        position = SNAPSHOT_HEADER.size
+        for student in students:
+            record = _encode_record(student, names)
+            offsets.append(position)
+            emails.append(student.get('email') or "")
+            file.write(_U32.pack(len(record)))
+            file.write(record)
+            position += 4 + len(record)
+        strings_offset = position
+        file.write(_U32.pack(len(names)))
+        for name in names:
+            data = name.encode()
+            file.write(_U16.pack(len(data)) + data)
+        offsets_offset = file.tell()
+        file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        index_offset = file.tell()
+        file.write(struct.pack(f"<{len(emails)}I", *sorted(range(len(emails)), key=emails.__getitem__)))
+        file.seek(0)
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(offsets),
+                                        strings_offset, offsets_offset, index_offset))
+
+class Snapshot:
+    # Read-only, memory-mapped view of a snapshot file. Records are decoded
+    # only when asked for: by position, by email (binary search over the
+    # email index) or by iterating in roster order.
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = None
+        self.count = 0
+        self.names = []
+        if os.fstat(self._file.fileno()).st_size == 0:
+            return
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, strings_offset, self._offsets, self._index = \
+            SNAPSHOT_HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} student snapshot")
+        (count,) = _U32.unpack_from(self._map, strings_offset)
+        position = strings_offset + 4
+        for _ in range(count):
+            (length,) = _U16.unpack_from(self._map, position)
+            self.names.append(self._map[position + 2:position + 2 + length].decode())
+            position += 2 + length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        (offset,) = _U64.unpack_from(self._map, self._offsets + 8 * position)
+        return self._decode(offset)
+
+    def __iter__(self):
+        # Records are stored back to back in roster order.
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(self.count):
+            yield self._decode(offset)
+            offset += 4 + _U32.unpack_from(self._map, offset)[0]
+
+    def find(self, email):
+        target = email.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            (position,) = _U32.unpack_from(self._map, self._index + 4 * middle)
+            (offset,) = _U64.unpack_from(self._map, self._offsets + 8 * position)
+            found = self._email(offset)
+            if found < target:
+                low = middle + 1
+            elif found > target:
+                high = middle
+            else:
+                return self._decode(offset)
+        return None
+
+    def _email(self, offset):
+        data = self._map
+        if data[offset + 4] == SNAPSHOT_JSON:
+            return (self._decode(offset).get('email') or "").encode()
+        _, _, id_length, name_length, email_length, _, _ = SNAPSHOT_RECORD.unpack_from(data, offset + 4)
+        # A None field is stored as length SNAPSHOT_NONE and takes no bytes.
+        start = offset + 4 + SNAPSHOT_RECORD.size + id_length % SNAPSHOT_NONE + name_length % SNAPSHOT_NONE
+        return data[start:start + email_length % SNAPSHOT_NONE]
+
+    def _decode(self, offset):
+        data = self._map
+        (length,) = _U32.unpack_from(data, offset)
+        offset += 4
+        if data[offset] == SNAPSHOT_JSON:
+            return json.loads(data[offset + 1:offset + length])
+        _, version, *lengths, count = SNAPSHOT_RECORD.unpack_from(data, offset)
+        position = offset + SNAPSHOT_RECORD.size
+        values = []
+        for length in lengths:
+            if length == SNAPSHOT_NONE:
+                values.append(None)
+            else:
+                values.append(data[position:position + length].decode())
+                position += length
+        subjects = []
+        for _ in range(count):
+            id_length, name, grade, is_float, mark = SNAPSHOT_SUBJECT.unpack_from(data, position)
+            position += SNAPSHOT_SUBJECT.size
+            if id_length == SNAPSHOT_NONE:
+                subject_id = None
+            else:
+                subject_id = data[position:position + id_length].decode()
+                position += id_length
+            subjects.append({'id': subject_id, 'name': self.names[name],
+                             'mark': mark if is_float else int(mark), 'grade': GRADES[grade]})
+        return {'id': values[0], 'name': values[1], 'email': values[2], 'password': values[3],
+                'subjects': subjects, 'version': version}
+
+class SnapshotDatabase(Database):
+    # The roster as a compact binary snapshot (see write_snapshot): no
+    # whitespace, subject names stored once, and single records readable
+    # through mmap without decoding the rest.
+    def __init__(self, path="students.snap", sync_directory=False):
+        super().__init__(path, sync_directory)
+
+    def load_students(self):
+        with paused_gc():
+            return list(self.iter_students())
+
+    def iter_students(self):
+        try:
+            with Snapshot(self.path) as snapshot:
+                yield from snapshot
+        except FileNotFoundError:
+            return
+        except (ValueError, struct.error) as e:
+            print(f"Error loading students data: {e}")
+
+    def find_student(self, email):
+        try:
+            with Snapshot(self.path) as snapshot:
+                return snapshot.find(email)
+        except FileNotFoundError:
+            return None
+
+    def save_students(self, students):
+        write_snapshot(self.path, students, self.sync_directory)
+
+STORAGE = {
+    'json': Database,
+    'journal': JournalDatabase,
+    'sqlite': SQLiteDatabase,
+    'binary': SnapshotDatabase,
+}
+
+def get_database():
+    storage = os.environ.get("UNIAPP_STORAGE", "json").lower()
+    # UNIAPP_SYNC_DIRECTORY=1 also fsyncs the directory after each file swap,
+    # so a save survives a power cut and not just a crash. SQLite does its
+    # own syncing.
+    sync_directory = os.environ.get("UNIAPP_SYNC_DIRECTORY", "").lower() in ("1", "true", "yes", "on")
+    if storage == "journal":
+        return JournalDatabase(sync_directory=sync_directory)
+    if storage == "sqlite":
+        return SQLiteDatabase(os.environ.get("UNIAPP_SQLITE_PATH", "students.db"))
+    if storage == "binary":
+        return SnapshotDatabase(os.environ.get("UNIAPP_SNAPSHOT_PATH", "students.snap"), sync_directory)
+    return Database(sync_directory=sync_directory)
+
+def migrate(source, target):
+    # Copy every student and the store metadata from one backend to another.
+    students = source.load_students()
+    target.save_students(students)
+    target.save_meta(source.load_meta())
+    print(f"\033[93mMigrated {len(students)} students from {source.path} to {target.path}.\033[0m")
+    return len(students)
+
+def migrate_to_sqlite(json_path="students.data", sqlite_path="students.db"):
+    return migrate(Database(json_path), SQLiteDatabase(sqlite_path))
+
+# Row fields query_students can order by; None keeps roster order.
+QUERY_SORTS = (None, 'id', 'name', 'email', 'mark', 'grade')
+
+class StudentRepository:
+    # Keeps the roster in memory, indexed by email and by student id, and only
+    # goes back to the database when the underlying file has changed.
+    def __init__(self, database=None, id_block_size=1):
+        self.database = database if database is not None else Database()
+        self.id_block_size = id_block_size
+        self._next_id = None
+        self._id_limit = None
+        self.by_email = {}
+        self.by_id = {}
+        # Lower-cased subject name -> grade -> student emails (a dict used as
+        # an ordered set), so admin queries cost about the size of their
+        # result. Emails, not ids, because ids from the old random generator
+        # can be shared by two students.
+        self.subject_index = {}
+        self.index_path = self.database.path + ".index"
+        # Roster position, name and email domain lookups for query_students,
+        # and its last match list, so paging through one view does not
+        # re-filter and re-sort the roster for every page. Both are rebuilt
+        # on first use after the roster changes.
+        self._roster_index = None
+        self._query_cache = None
+        self._stamp = None
+        self._loaded = False
+        self._batch_depth = 0
+        self._pending = []
+        self.lock = FileLock(self.database.path + ".lock")
+
+    def refresh(self):
+        if self._pending:
+            # Inside a batch we hold the exclusive lock, so nothing else can
+            # have changed the store; reloading would drop unwritten changes.
+            return
+        with self.lock.shared():
+            stamp = self.database.stamp()
+            if self._loaded and stamp == self._stamp:
+                return
+            self._index(self.database.load_students(), stamp)
+            self._stamp = stamp
+            self._loaded = True
+
+    def _index(self, students, stamp):
+        self.by_email = {}
+        self.by_id = {}
+        self._roster_changed()
+        for student in students:
+            self.by_email[student['email']] = student
+            self.by_id.setdefault(str(student['id']), student)
+        if not self._load_subject_index(stamp):
+            self.subject_index = {}
+            for student in self.by_email.values():
+                self._index_subjects(student)
+
+    def _index_subjects(self, student):
+        seen = set()
+        for subject in student['subjects']:
+            name = subject['name'].lower()
+            # Like partition_students, only a student's first enrolment in a
+            # subject counts.
+            if name not in seen:
+                seen.add(name)
+                self.subject_index.setdefault(name, {}).setdefault(subject['grade'], {})[student['email']] = None
+
+    def _unindex_subjects(self, student):
+        for subject in student['subjects']:
+            name = subject['name'].lower()
+            grades = self.subject_index.get(name)
+            if grades is None or subject['grade'] not in grades:
+                continue
+            grades[subject['grade']].pop(student['email'], None)
+            if not grades[subject['grade']]:
+                del grades[subject['grade']]
+            if not grades:
+                del self.subject_index[name]
+
+    def _load_subject_index(self, stamp):
+        # The index is persisted next to the data and reused only if it was
+        # written for exactly this version of the store.
+        try:
+            with open(self.index_path, "r") as file:
+                saved = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        if saved.get('key') != 'email' or saved.get('stamp') != json.loads(json.dumps(stamp)):
+            return False
+        self.subject_index = {name: {grade: dict.fromkeys(emails) for grade, emails in grades.items()}
+                              for name, grades in saved['subjects'].items()}
+        return True
+
+    def _save_subject_index(self):
+        subjects = {name: {grade: list(emails) for grade, emails in grades.items()}
+                    for name, grades in self.subject_index.items()}
+        with atomic_open(self.index_path) as file:
+            json.dump({'key': 'email', 'stamp': self._stamp, 'subjects': subjects}, file, separators=(',', ':'))
+
+    def all(self):
+        self.refresh()
+        return list(self.by_email.values())
+
+    def iter_students(self):
+        # Serve from the cache when it is current; otherwise stream straight
+        # from the database without loading the whole roster.
+        with self.lock.shared():
+            if self._loaded and self.database.stamp() == self._stamp:
+                yield from list(self.by_email.values())
+            else:
+                yield from self.database.iter_students()
+
+    def get_by_email(self, email):
+        self.refresh()
+        return self.by_email.get(email)
+
+    def get_by_id(self, student_id):
+        self.refresh()
+        return self.by_id.get(str(student_id))
+
+    def add(self, student):
+        with self.lock.exclusive():
+            self.refresh()
+            if student['email'] in self.by_email:
+                return False
+            self.by_email[student['email']] = student
+            self.by_id.setdefault(str(student['id']), student)
+            self._index_subjects(student)
+            self._roster_changed()
+            self._commit('put', student)
+            return True
+
+    def update(self, student):
+        # Optimistic concurrency: the write only goes through if the stored
+        # record still has the version the caller loaded. Returns False when
+        # the caller's copy is stale or the student has been removed.
+        with self.lock.exclusive():
+            self.refresh()
+            current = self.by_email.get(student['email'])
+            version = student.get('version', 0)
+            if current is None or current.get('version', 0) != version:
+                return False
+            # A field the new record drops counts as changed too.
+            fields = [field for field in {**current, **student}
+                      if field != 'version' and student.get(field) != current.get(field)]
+            if not fields:
+                # Nothing changed, so there is nothing to write.
+                return True
+            student['version'] = version + 1
+            self._unindex_subjects(current)
+            self.by_email[student['email']] = student
+            if self.by_id.get(str(student['id'])) is current:
+                # Only when this student is the one the id resolves to; a
+                # shared id keeps pointing at its first holder.
+                self.by_id[str(student['id'])] = student
+            self._index_subjects(student)
+            self._roster_changed()
+            self._commit('put', student, fields)
+            return True
+
+    def remove(self, student_id):
+        with self.lock.exclusive():
+            self.refresh()
+            student = self.by_id.pop(str(student_id), None)
+            if student is None:
+                return False
+            del self.by_email[student['email']]
+            self._unindex_subjects(student)
+            self._roster_changed()
+            self._commit('delete', student)
+            return True
+
+    def allocate_student_id(self, block_size=None):
+        # Ids come from a counter in the store's metadata, reserved
+        # id_block_size (or block_size) at a time under the exclusive lock, so
+        # concurrent registrations never share an id and nothing scans the
+        # roster.
+        if self._next_id is None or self._next_id >= self._id_limit:
+            block_size = block_size or self.id_block_size
+            with self.lock.exclusive():
+                meta = self.database.load_meta()
+                start = meta.get('next_student_id')
+                if start is None:
+                    # First allocation for this store: start above every id the
+                    # old random generator may already have handed out.
+                    start = max((int(student['id']) for student in self.iter_students()
+                                 if str(student['id']).isdigit()), default=0) + 1
+                meta['next_student_id'] = start + block_size
+                self.database.save_meta(meta)
+            self._next_id, self._id_limit = start, start + block_size
+        student_id = self._next_id
+        self._next_id += 1
+        return str(student_id).zfill(6)
+
+    def group_students(self, subject_name, grades=None):
+        # {grade: [{'id', 'name'}, ...]} in grade order, students in roster
+        # order within a grade, or None for a subject nobody takes. grades
+        # keeps only those grades.
+        if hasattr(self.database, 'group_students') and not self._pending:
+            return self.database.group_students(subject_name, grades)
+        self.refresh()
+        grade_groups = self.subject_index.get(subject_name.lower())
+        if not grade_groups:
+            return None
+        positions = self._roster_indexes()[0]
+        return {grade: [self._summary(email) for email in sorted(grade_groups[grade], key=positions.get)]
+                for grade in sorted(grade_groups) if grades is None or grade in grades}
+
+    def partition_students(self, subject_name):
+        if hasattr(self.database, 'partition_students') and not self._pending:
+            return self.database.partition_students(subject_name)
+        self.refresh()
+        grades = self.subject_index.get(subject_name.lower())
+        if not grades:
+            return None
+        pass_students = []
+        fail_students = []
+        for grade in sorted(grades):
+            summaries = [self._summary(email) for email in grades[grade]]
+            if grade != 'F':
+                pass_students.extend(summaries)
+            else:
+                fail_students.extend(summaries)
+        return pass_students, fail_students
+
+    def has_subject(self, subject_name):
+        self.refresh()
+        return subject_name.lower() in self.subject_index
+
+    def query_students(self, subject=None, grades=None, name_prefix=None, email_domain=None, sort=None,
+                       descending=False, offset=0, limit=None, after=None):
+        # One page of the roster for browsing: returns (number of matches,
+        # rows offset:offset + limit). With a subject only its students are
+        # considered and each row carries their mark and grade in it; grades
+        # keeps students with one of those grades (in the subject, or in any
+        # subject without one). name_prefix and email_domain are matched
+        # without regard to case. after is the email of the last row of the
+        # previous page, and the page starts just past that student. Matches
+        # come from the subject, name and domain indexes, and only the
+        # returned page is turned into rows.
+        if sort not in QUERY_SORTS:
+            raise ValueError(f"Cannot sort by {sort!r}")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit cannot be negative")
+        if sort in ('mark', 'grade') and subject is None:
+            raise ValueError(f"Sorting by {sort} needs a subject")
+        self.refresh()
+        name = subject.lower() if subject is not None else None
+        key = (name, tuple(sorted(grades)) if grades is not None else None,
+               name_prefix.lower() if name_prefix is not None else None,
+               email_domain.lower().lstrip('@') if email_domain is not None else None, sort)
+        if self._query_cache is None or self._query_cache[0] != key:
+            self._query_cache = (key,) + self._match(*key)
+        _, sort_key, keys, matches = self._query_cache
+
+        # Matches are kept in ascending order; a descending page is read
+        # backwards from the end.
+        if descending:
+            stop = len(keys) if after is None else bisect_left(keys, self._cursor(sort_key, after))
+            stop = max(stop - offset, 0)
+            start = max(stop - limit, 0) if limit is not None else 0
+            page = matches[start:stop][::-1]
+        else:
+            start = (0 if after is None else bisect_right(keys, self._cursor(sort_key, after))) + offset
+            page = matches[start:start + limit if limit is not None else None]
+        return len(matches), [self._row(student, name) for student in page]
+
+    def _cursor(self, sort_key, email):
+        student = self.by_email.get(email)
+        try:
+            return sort_key(student)
+        except (KeyError, TypeError, StopIteration):
+            raise ValueError(f"Cannot continue after {email}: not a student in these results") from None
+
+    def _roster_changed(self):
+        self._roster_index = None
+        self._query_cache = None
+
+    def _roster_indexes(self):
+        if self._roster_index is None:
+            positions = {}
+            names = []
+            domains = {}
+            for position, (email, student) in enumerate(self.by_email.items()):
+                positions[email] = position
+                names.append((str(student['name']).lower(), position, email))
+                domains.setdefault(email.rpartition('@')[2].lower(), []).append(email)
+            names.sort()
+            self._roster_index = (positions, [name for name, _, _ in names], [email for _, _, email in names], domains)
+        return self._roster_index
+
+    def _match(self, name, grades, name_prefix, email_domain, sort):
+        positions, names, name_emails, domains = self._roster_indexes()
+        # Each filter gives the emails it allows; the smallest set is
+        # checked against the others.
+        allowed = []
+        if name is not None or grades is not None:
+            subjects = [self.subject_index.get(name, {})] if name is not None else self.subject_index.values()
+            emails = {}
+            for grade_groups in subjects:
+                for grade in sorted(grade_groups):
+                    if grades is None or grade in grades:
+                        emails.update(grade_groups[grade])
+            allowed.append(list(emails))
+        if name_prefix is not None:
+            allowed.append(name_emails[bisect_left(names, name_prefix):bisect_left(names, name_prefix + "\U0010ffff")])
+        if email_domain is not None:
+            allowed.append(domains.get(email_domain, []))
+        if allowed:
+            allowed.sort(key=len)
+            emails = allowed[0]
+            for others in allowed[1:]:
+                others = set(others)
+                emails = [email for email in emails if email in others]
+        else:
+            emails = self.by_email
+
+        # Ties, and the order without a sort, follow the roster, so every
+        # student has a distinct key for a cursor to resume from.
+        if sort in ('mark', 'grade'):
+            def sort_key(student):
+                return self._enrolment(student, name)[sort], positions[student['email']]
+        elif sort is not None:
+            def sort_key(student):
+                return str(student[sort]), positions[student['email']]
+        else:
+            def sort_key(student):
+                return positions[student['email']]
+        ordered = sorted((sort_key(self.by_email[email]), self.by_email[email]) for email in emails)
+        return sort_key, [key for key, _ in ordered], [student for _, student in ordered]
+
+    @staticmethod
+    def _enrolment(student, name):
+        # The student's first enrolment in the subject, as the index records.
+        return next(subject for subject in student['subjects'] if subject['name'].lower() == name)
+
+    def _row(self, student, name):
+        row = {'id': student['id'], 'name': student['name'], 'email': student['email']}
+        if name is not None:
+            subject = self._enrolment(student, name)
+            row['mark'] = subject['mark']
+            row['grade'] = subject['grade']
+        return row
+
+    def _summary(self, email):
+        student = self.by_email[email]
+        return {'id': student['id'], 'name': student['name']}
+
+    @contextmanager
+    def batch(self):
+        # Group commit: changes made inside the block are written together
+        # when the outermost batch exits, all under one exclusive lock.
+        with self.lock.exclusive():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._pending:
+                    changes, self._pending = self._pending, []
+                    self._write(changes)
+
+    def _commit(self, op, student, fields=None):
+        # fields names what an update changed (None: the whole record), for
+        # backends that can write less than the full record.
+        if self._batch_depth:
+            self._pending.append((op, student, fields))
         else:
-            print("\033[93mDatabase clearing canceled.\033[0m")
+            self._write([(op, student, fields)])
+
+    def _write(self, changes):
+        # Backends with a journal take just the changed records; everything
+        # else (and journal compaction) writes the whole roster.
+        if hasattr(self.database, 'append'):
+            self.database.append(changes)
+            if self.database.needs_compaction():
+                self.save()
+            else:
+                self._stamp = self.database.stamp()
+        else:
+            self.save()
+
+    def save(self):
+        with self.lock.exclusive():
+            self.database.save_students(list(self.by_email.values()))
+            self._stamp = self.database.stamp()
+            self._save_subject_index()
+
+    def clear(self):
+        # Under the exclusive lock, so no other session is halfway through
+        # reading or writing the store while it is emptied.
+        with self.lock.exclusive():
+            self.database.clear()
+            self._loaded = False
+
+repository = StudentRepository(get_database())
+
+def post_marks(marks, boundaries=GRADE_BOUNDARIES):
+    # Apply (student_id, subject_id, mark) rows to the stored roster: every
+    # mark is graded in one assign_grades() pass and all affected students
+    # are saved in a single batched write. Returns the number of marks
+    # applied and a list of (row, error) pairs for the rows that were not.
+    errors = []
+    valid = []
+    for row, (student_id, subject_id, mark) in enumerate(marks, start=1):
+        if isinstance(mark, bool) or not isinstance(mark, (int, float)) or not math.isfinite(mark):
+            errors.append((row, f"Invalid mark: {mark!r}"))
+        else:
+            valid.append((row, student_id, subject_id, mark))
+    codes = assign_grades([mark for _, _, _, mark in valid], boundaries)
+    by_student = {}
+    for (row, student_id, subject_id, mark), code in zip(valid, codes):
+        by_student.setdefault(str(student_id), []).append((row, subject_id, mark, GRADES[code]))
+
+    applied = 0
+    with repository.batch():
+        for student_id, rows in by_student.items():
+            current = repository.get_by_id(student_id)
+            if current is None:
+                errors.extend((row, f"Unknown student {student_id}") for row, _, _, _ in rows)
+                continue
+            record = dict(current, subjects=[dict(subject) for subject in current['subjects']])
+            subjects = {subject['id']: subject for subject in record['subjects']}
+            changed = False
+            for row, subject_id, mark, grade in rows:
+                subject = subjects.get(subject_id)
+                if subject is None:
+                    errors.append((row, f"Student {student_id} is not enrolled in subject {subject_id}"))
+                    continue
+                subject['mark'] = mark
+                subject['grade'] = grade
+                applied += 1
+                changed = True
+            if changed:
+                repository.update(record)
+    errors.sort()
+    return applied, errors
+
+IMPORT_ID_BLOCK = 1024
+
+def _open_output(path):
+    if path == "-":
+        return open(sys.stdout.fileno(), "w", newline="", closefd=False)
+    return open(path, "w", newline="")
+
+def _read_rows(path):
+    # Yield (line number, row dict) from a CSV file with a header row or a
+    # JSON-lines file, without reading it all in.
+    with open(path, "r", newline="") as file:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, e
+
+def import_students(path):
+    # Register every name/email/password row of a CSV or JSONL file in one
+    # batched write. Rows are checked with the same rules as register_student
+    # and against emails already registered. Returns the number imported and
+    # a list of (line, email, reason) for the rows that were skipped.
+    # Passwords may also be hashes, as written by export_students; plaintext
+    # ones are hashed a block at a time across threads.
+    imported = 0
+    errors = []
+    pending = {}
+
+    def flush():
+        nonlocal imported
+        plain = [row for row in pending.values() if not is_password_hash(row['password'])]
+        for row, hashed in zip(plain, hash_passwords(row['password'] for row in plain)):
+            row['password'] = hashed
+        for email, row in pending.items():
+            student = Student(id=repository.allocate_student_id(IMPORT_ID_BLOCK),
+                              name=row.get('name'), email=email, password=row['password'])
+            repository.add(student.to_dict())
+        imported += len(pending)
+        pending.clear()
+
+    with repository.batch():
+        for line, row in _read_rows(path):
+            if not isinstance(row, dict):
+                errors.append((line, None, f"Unreadable row: {row}"))
+                continue
+            email = row.get('email') or ""
+            password = row.get('password') or ""
+            reasons = validation.check_email(email)
+            hashed = password.startswith(PASSWORD_SCHEME + "$")
+            if not (reasons or hashed):
+                reasons = validation.check_password(password)
+            if not reasons and hashed and not is_password_hash(password):
+                errors.append((line, email, "Malformed password hash."))
+            elif reasons:
+                errors.append((line, email, " ".join(validation.MESSAGES[reason] for reason in reasons)))
+            elif email in pending or repository.get_by_email(email) is not None:
+                errors.append((line, email, "Student already registered."))
+            else:
+                pending[email] = {'name': row.get('name'), 'password': password}
+                if len(pending) >= IMPORT_ID_BLOCK:
+                    flush()
+        flush()
+    return imported, errors
+
+def export_students(path, format="jsonl"):
+    # Stream the roster to a CSV (id, name, email, password) or JSONL (full
+    # records) file; "-" writes to stdout.
+    count = 0
+    with _open_output(path) as file:
+        if format == "csv":
+            writer = csv.writer(file)
+            writer.writerow(['id', 'name', 'email', 'password'])
+            for student in repository.iter_students():
+                writer.writerow([student['id'], student['name'], student['email'], student['password']])
+                count += 1
+        else:
+            for student in repository.iter_students():
+                file.write(json.dumps(student, separators=(',', ':')) + "\n")
+                count += 1
+    return count
+
+# The field each batch operation reads, besides the student's email or id.
+BATCH_FIELDS = {'enrol': 'subject', 'remove': 'subject_id', 'change-password': 'password'}
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+def run_batch(path, interval=None):
+    # Replay a JSONL script of student operations, one per line:
+    #   {"op": "enrol", "email": ..., "subject": ...}
+    #   {"op": "remove", "email": ..., "subject_id": ...}
+    #   {"op": "change-password", "email": ..., "password": ...}
+    # ("id" may be given instead of "email"). Students are loaded once and
+    # mutated in memory; changed students are saved together every
+    # `interval` operations, or once at the end when interval is None.
+    if interval is not None and interval < 1:
+        raise ValueError("interval must be a positive number of operations")
+    students = {}
+    dirty = {}
+    errors = []
+    operations = 0
+    applied = 0
+
+    def flush():
+        with repository.batch():
+            for email, student in dirty.items():
+                record = student.to_dict()
+                if repository.update(record):
+                    student.version = record['version']
+                    student.mark_clean()
+                else:
+                    errors.append((None, email, "Changed by another session; changes since the last save were dropped."))
+                    students.pop(email, None)
+        dirty.clear()
+
+    started = time.perf_counter()
+    # The model reports through print(); what it prints for each operation
+    # is kept so a failure can give its reason.
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            for line, op in _read_rows(path):
+                operations += 1
+                if not isinstance(op, dict):
+                    errors.append((line, None, f"Unreadable operation: {op}"))
+                    continue
+                key = op.get('email', op.get('id'))
+                if not isinstance(key, (str, int)):
+                    errors.append((line, None, "Missing or invalid field: email or id"))
+                    continue
+                record = repository.get_by_email(key) if 'email' in op else repository.get_by_id(key)
+                if record is None:
+                    errors.append((line, key, "Student does not exist."))
+                    continue
+                kind = op.get('op')
+                if kind not in BATCH_FIELDS:
+                    errors.append((line, record['email'], f"Unknown operation: {kind}"))
+                    continue
+                value = op.get(BATCH_FIELDS[kind])
+                if not isinstance(value, str):
+                    errors.append((line, record['email'], f"Missing or invalid field: {BATCH_FIELDS[kind]}"))
+                    continue
+                student = students.get(record['email'])
+                if student is None:
+                    student = students[record['email']] = Student(**record)
+                output.seek(0)
+                output.truncate()
+                if kind == 'enrol':
+                    done = student.enroll_subject(value)
+                elif kind == 'remove':
+                    done = student.remove_subject(value)
+                else:
+                    done = student.change_password(value, value)
+                if not done:
+                    messages = ANSI_ESCAPE.sub("", output.getvalue()).strip().splitlines()
+                    errors.append((line, student.email, messages[-1] if messages else f"{kind} was not applied."))
+                    continue
+                applied += 1
+                dirty[student.email] = student
+                if interval and applied % interval == 0:
+                    flush()
+        finally:
+            # Whatever was applied before an unexpected failure is still
+            # saved.
+            flush()
+    elapsed = time.perf_counter() - started
+    return {
+        'operations': operations,
+        'applied': applied,
+        'errors': errors,
+        'seconds': elapsed,
+        'ops_per_sec': operations / elapsed if elapsed else 0.0
+    }
 
 def register_student():
     print("\033[38;2;0;128;0mStudent Sign up\033[0m")
@@ -141,41 +1738,145 @@ def register_student():
     if not validate_password(password):
         print("\033[38;2;255;0;0mInvalid password format.\033[0m")
         return
-    students = Database.load_students()
-    if any(student['email'] == email for student in students):
+    if repository.get_by_email(email) is not None:
         print("\033[38;2;255;0;0mStudent already registered.\033[0m")
         return
 
     name = input("Enter your name: ")
-    student = Student(name=name, email=email, password=password)
-    students.append(student.to_dict())
-    Database.save_students(students)
+    student = Student(name=name, email=email, password=hash_password(password))
+    if not repository.add(student.to_dict()):
+        print("\033[38;2;255;0;0mStudent already registered.\033[0m")
+        return
     print("\033[38;2;255;255;0mStudent registered successfully.\033[0m")
 
-def update_student_data(student):
-    with open("students.data", "r") as file:
-        students = json.load(file)
-    updated_students = [s if s['id'] != student['id'] else student.to_dict() for s in students]
-    with open("students.data", "w") as file:
-        json.dump(updated_students, file, indent=4)
+def update_student_data(student, redo):
+    # If another session saved this student after we loaded it, re-apply the
+    # change to the latest copy rather than overwriting their update. Nothing
+    # is written when the action did not change the student.
+    while student.dirty:
+        record = student.to_dict()
+        if repository.update(record):
+            student.version = record['version']
+            student.mark_clean()
+            return student
+        latest = repository.get_by_email(student.email)
+        if latest is None:
+            print("\033[91mStudent no longer exists.\033[0m")
+            return student
+        print("\033[93mYour record was changed in another session, applying the change to the latest copy.\033[0m")
+        student = Student(**latest)
+        redo(student)
+    return student
 
 def validate_email(email):
-    return re.match(r"[^@]+@university.com", email) is not None
+    return validation.is_valid_email(email)
 
 def validate_password(password):
-    pattern = r"^[A-Z][a-zA-Z]{5,}[0-9]{3,}$"
-    match = re.match(pattern, password)
-    if match:
-        return True
-    else:
+    reasons = validation.check_password(password)
+    if reasons:
         print("\033[91mPassword format is invalid.\033[0m")
-        if not re.match(r"^[A-Z]", password):
-            print("\033[91mPassword does not start with an uppercase letter.\033[0m")
-        if not re.match(r"^[A-Z][a-zA-Z]{5,}", password):
-            print("\033[91mPassword does not have at least 5 letters after the initial uppercase letter.\033[0m")
-        if not re.match(r"^[A-Z][a-zA-Z]{5,}[0-9]{3,}$", password):
-            print("\033[91mPassword does not end with at least 3 digits.\033[0m")
+        for reason in reasons:
+            print(f"\033[91m{validation.MESSAGES[reason]}\033[0m")
+    return not reasons
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PASSWORD_ITERATIONS
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"{PASSWORD_SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+def hash_passwords(passwords):
+    # pbkdf2_hmac releases the GIL, so bulk jobs can hash on every core.
+    with ThreadPoolExecutor() as pool:
+        return list(pool.map(hash_password, passwords))
+
+def parse_password_hash(value):
+    # (iterations, salt, digest) of a well-formed stored hash, or None.
+    parts = value.split("$") if isinstance(value, str) else ()
+    if len(parts) != 4 or parts[0] != PASSWORD_SCHEME:
+        return None
+    _, iterations, salt, digest = parts
+    if not (iterations.isascii() and iterations.isdigit()) or int(iterations) < 1:
+        return None
+    try:
+        salt, digest = bytes.fromhex(salt), bytes.fromhex(digest)
+    except ValueError:
+        return None
+    if not salt or len(digest) != hashlib.sha256().digest_size:
+        return None
+    return int(iterations), salt, digest
+
+def is_password_hash(value):
+    return parse_password_hash(value) is not None
+
+def password_needs_rehash(stored):
+    parsed = parse_password_hash(stored)
+    return parsed is None or parsed[0] != PASSWORD_ITERATIONS
+
+class VerificationCache:
+    # Recent successful logins, so a returning student skips the hash. Entries
+    # are HMACs of (stored hash, password) under a key that only lives in this
+    # process: the cache never holds a password or anything checkable offline,
+    # and an entry stops matching as soon as the stored hash changes.
+    def __init__(self, maxsize=LOGIN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _token(self, stored, password):
+        return hmac.new(self._key, f"{stored}\0{password}".encode(), 'sha256').digest()
+
+    def __contains__(self, item):
+        token = self._token(*item)
+        with self._lock:
+            if token not in self._entries:
+                return False
+            self._entries.move_to_end(token)
+            return True
+
+    def add(self, stored, password):
+        token = self._token(stored, password)
+        with self._lock:
+            self._entries[token] = None
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+verification_cache = VerificationCache()
+
+def verify_password(stored, password):
+    parsed = parse_password_hash(stored)
+    if parsed is None:
+        if stored.startswith(PASSWORD_SCHEME + "$"):
+            # A damaged hash matches no password, not even its own text.
+            return False
+        # Plaintext left over from before passwords were hashed.
+        return hmac.compare_digest(stored.encode(), password.encode())
+    if (stored, password) in verification_cache:
+        return True
+    iterations, salt, digest = parsed
+    candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    if not hmac.compare_digest(candidate, digest):
         return False
+    verification_cache.add(stored, password)
+    return True
+
+def authenticate(email, password):
+    student = repository.get_by_email(email)
+    if student is None or not verify_password(student['password'], password):
+        return None
+    if password_needs_rehash(student['password']):
+        # The password is known good, so this is the moment to replace a
+        # plaintext or outdated hash.
+        upgraded = dict(student, password=hash_password(password))
+        if repository.update(upgraded):
+            return upgraded
+    return student
 
 def login_student():
     print("\033[92mStudent Log in\033[0m")
@@ -188,16 +1889,15 @@ def login_student():
         print("\033[38;2;255;0;0mInvalid password format.\033[0m")
         return
 
-    students = Database.load_students()
-    student_data = next((student for student in students if student['email'] == email and student['password'] == password), None)
+    student_data = authenticate(email, password)
     if not student_data:
         print("\033[38;2;255;255;0mEmail and password formats acceptable.\033[0m")
         print("\033[91mStudent does not exist.\033[0m")
         return
     student = Student(**student_data)
-    student_course_menu(student, students)
+    student_course_menu(student)
 
-def student_course_menu(student, students):
+def student_course_menu(student):
     while True:
         print("\033[38;2;0;206;209mStudent Course Menu\033[0m")
         print("\033[38;2;0;206;209m(C) Change Password\033[0m")
@@ -209,17 +1909,17 @@ def student_course_menu(student, students):
 
         if choice == 'C':
             new_password = input("Enter new password: ")
-            if validate_password(new_password):
-                student.change_password(new_password)
-                Database.save_students([s if s['id'] != student.id else student.to_dict() for s in students])
+            if validate_password(new_password) and student.change_password(new_password):
+                hashed = student.password
+                student = update_student_data(student, lambda s: setattr(s, 'password', hashed))
         elif choice == 'E':
             subject_name = input("Enter subject name: ")
             student.enroll_subject(subject_name)
-            Database.save_students([s if s['id'] != student.id else student.to_dict() for s in students])
+            student = update_student_data(student, lambda s: s.enroll_subject(subject_name))
         elif choice == 'R':
             subject_id = input("Enter subject ID to remove: ")
             student.remove_subject(subject_id)
-            Database.save_students([s if s['id'] != student.id else student.to_dict() for s in students])
+            student = update_student_data(student, lambda s: s.remove_subject(subject_id))
         elif choice == 'S':
             student.show_subjects()
         elif choice == 'X':
@@ -239,7 +1939,7 @@ def admin_menu():
         print("\033[38;2;0;206;209m(X) Exit\033[0m")
         choice = input("\033[38;2;0;206;209mEnter your choice (C, G, P, R, S, X): \033[0m").upper()
         if choice == 'C':
-            Database.clear_database()
+            clear_database()
         elif choice == 'G':
             print("\033[38;2;255;255;0mGrade Grouping.\033[0m")
             subject_name = input("\033[38;2;0;206;209mEnter the subject name:\033[0m")
@@ -258,101 +1958,229 @@ def admin_menu():
         else:
             print("\033[38;2;255;0;0mInvalid choice. Please try again.\033[0m")
 
-def group_students(subject_name):
-    try:
-        with open("students.data", 'r') as file:
-            try:
-                students = json.load(file)
-            except json.JSONDecodeError:
-                print("<Nothing to display>")
-                return
-    except FileNotFoundError:
-        print("<Nothing to display>")
-        return
+REPORT_BUFFER_SIZE = 256 * 1024
 
-    grade_groups = {}
-    subject_found = False
+class ReportWriter:
+    # Admin reports are built up in memory and written out in chunks of
+    # about buffer_size characters instead of one print() per line. Colour
+    # codes are only written to a terminal. format is 'text', 'csv' (fields
+    # is the header row) or 'json' (one document, passed to json()).
+    def __init__(self, format='text', fields=(), stream=None, colour=None, buffer_size=REPORT_BUFFER_SIZE):
+        self.format = format
+        self.stream = stream if stream is not None else sys.stdout
+        if colour is None:
+            isatty = getattr(self.stream, 'isatty', None)
+            colour = isatty is not None and isatty()
+        self.colour = colour
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size = 0
+        if format == 'csv':
+            self._csv = csv.writer(self, lineterminator="\n")
+        # The CSV header goes out with the first row, or at the end of an
+        # empty report, but not ahead of an error.
+        self._header = fields if format == 'csv' else None
 
-    for student in students:
-        for subject in student['subjects']:
-            if subject['name'].lower() == subject_name.lower():
-                subject_found = True
-                grade = subject['grade']
-                if grade not in grade_groups:
-                    grade_groups[grade] = []
-                grade_groups[grade].append(student)
-
-    if not subject_found:
-        print(f"\033[91mInvalid subject: {subject_name}\033[0m")
-        return
+    def __enter__(self):
+        return self
 
-    if not grade_groups:
-        print("\033[93m<Nothing to display>\033[0m")
-        return
+    def __exit__(self, exc_type, exc, tb):
+        # A report cut short by an error is not written out.
+        if exc_type is None:
+            self.close()
 
-    for grade, students in grade_groups.items():
-        print(f"Grade {grade} in {subject_name}:")
-        for student in students:
-            print(f"  Student ID: {student['id']}, Name: {student['name']}")
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
 
+    def flush(self):
+        if self._parts:
+            self.stream.write("".join(self._parts))
+            self._parts = []
+            self._size = 0
 
-def partition_students(subject_name):
-    try:
-        with open("students.data", 'r') as file:
+    def close(self):
+        if self._header is not None:
+            self._csv.writerow(self._header)
+            self._header = None
+        self.flush()
+        self.stream.flush()
+
+    def text(self, line, colour=None):
+        # Headings and other lines that only belong in the plain format.
+        # colour is an ANSI code such as "93".
+        if self.format == 'text':
+            self.write(f"\033[{colour}m{line}\033[0m\n" if colour and self.colour else line + "\n")
+
+    def record(self, values, line):
+        # One row of the report: line in the plain format, values in CSV.
+        if self.format == 'text':
+            self.write(line + "\n")
+        elif self.format == 'csv':
+            if self._header is not None:
+                self._csv.writerow(self._header)
+                self._header = None
+            self._csv.writerow(values)
+
+    def json(self, data):
+        self.write(json.dumps(data, separators=(',', ':')) + "\n")
+
+    def json_array(self, items):
+        # The same as json(list(items)), written an item at a time.
+        separator = "["
+        for item in items:
+            self.write(separator + json.dumps(item, separators=(',', ':')))
+            separator = ","
+        self.write("[]\n" if separator == "[" else "]\n")
+
+    def note(self, message, colour="93"):
+        # Status messages go to stderr rather than into CSV or JSON output.
+        if self.format == 'text':
+            self.text(message, colour)
+        else:
+            print(message, file=sys.stderr)
+
+    def error(self, message):
+        self._header = None
+        if self.format == 'json':
+            self.json({'error': message})
+        else:
+            self.note(message, "91")
+
+def query_page(limit=None, offset=0, after=None, **filters):
+    # Run a query_students page and also report where the next page starts
+    # (the email to pass as after), or None when this is the last page.
+    total, rows = repository.query_students(
+        offset=offset, limit=limit + 1 if limit is not None else None, after=after, **filters)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        # With limit 0 there is no last row to continue after.
+        return total, rows, rows[-1]['email'] if rows else None
+    return total, rows, None
+
+def group_students(subject_name, format='text', limit=None, offset=0, after=None, **filters):
+    # filters: grades, name_prefix and email_domain, as for
+    # StudentRepository.query_students.
+    with ReportWriter(format, ('grade', 'id', 'name')) as report:
+        if (limit is None and not offset and after is None
+                and filters.get('name_prefix') is None and filters.get('email_domain') is None):
+            # The whole subject: the backend groups it itself where it can
+            # (SQLite does it in one query) without loading the roster.
+            grade_groups = repository.group_students(subject_name, filters.get('grades'))
+            if grade_groups is None:
+                report.error(f"Invalid subject: {subject_name}")
+                return False
+            rows = [dict(student, grade=grade) for grade, students in grade_groups.items() for student in students]
+            total, next_after = len(rows), None
+        else:
+            if not repository.has_subject(subject_name):
+                report.error(f"Invalid subject: {subject_name}")
+                return False
             try:
-                students = json.load(file)
-            except json.JSONDecodeError:
-                print("<Nothing to display>")
-                return
-    except FileNotFoundError:
-        print("<Nothing to display>")
-        return
+                total, rows, next_after = query_page(limit, offset, after, subject=subject_name, sort='grade',
+                                                     **filters)
+            except ValueError as e:
+                report.error(str(e))
+                return False
 
-    pass_students = []
-    fail_students = []
-    subject_found = False
+        if format == 'json':
+            grade_groups = {}
+            for student in rows:
+                grade_groups.setdefault(student['grade'], []).append({'id': student['id'], 'name': student['name']})
+            report.json({'subject': subject_name, 'grades': grade_groups, 'total': total, 'next_after': next_after})
+            return True
 
-    for student in students:
-        for subject in student['subjects']:
-            if subject['name'].lower() == subject_name.lower():
-                subject_found = True
-                if subject['grade'] != 'F':
-                    pass_students.append(student)
-                else:
-                    fail_students.append(student)
-                break
+        if not rows:
+            report.text("<Nothing to display>", "93")
+            return True
 
-    if not subject_found:
-        print(f"\033[91mInvalid subject: {subject_name}\033[0m")
-        return
+        grade = None
+        for student in rows:
+            if student['grade'] != grade:
+                grade = student['grade']
+                report.text(f"Grade {grade} in {subject_name}:")
+            report.record((grade, student['id'], student['name']),
+                          f"  Student ID: {student['id']}, Name: {student['name']}")
+        if next_after is not None:
+            report.note(f"Showing {len(rows)} of {total}. Next page: --after {next_after}")
+    return True
 
-    print(f"Pass Students in {subject_name}:")
-    for student in pass_students:
-        print(f"  ID: {student['id']}, Name: {student['name']}")
-
-    print(f"Fail Students in {subject_name}:")
-    for student in fail_students:
-        print(f"  ID: {student['id']}, Name: {student['name']}")
-
-def remove_student():
-    student_id = input("Enter student ID to remove: ")
-    students = Database.load_students()
-    student_found = any(str(student['id']) == student_id for student in students)
-    if student_found:
-        students = [student for student in students if str(student['id']) != student_id]
-        Database.save_students(students)
-        print(f"\033[93mStudent (ID: {student_id}) removed.\033[0m")
+
+def partition_students(subject_name, format='text'):
+    with ReportWriter(format, ('result', 'id', 'name')) as report:
+        partition = repository.partition_students(subject_name)
+        if partition is None:
+            report.error(f"Invalid subject: {subject_name}")
+            return False
+        pass_students, fail_students = partition
+
+        if format == 'json':
+            report.json({'subject': subject_name, 'pass': pass_students, 'fail': fail_students})
+            return True
+
+        for result, students in (('pass', pass_students), ('fail', fail_students)):
+            report.text(f"{result.capitalize()} Students in {subject_name}:")
+            for student in students:
+                report.record((result, student['id'], student['name']),
+                              f"  ID: {student['id']}, Name: {student['name']}")
+    return True
+
+def clear_database():
+    confirmation = input("\033[91mAre you sure you want to clear the database (YES)/(NO): \033[0m").upper()
+    if confirmation == 'YES':
+        repository.clear()
+        print("\033[93mStudents data cleared.\033[0m")
     else:
-        print(f"\033[91mStudent (ID: {student_id}) does not exist.\033[0m")
+        print("\033[93mDatabase clearing canceled.\033[0m")
 
-def show_students():
-    print("\033[93mStudent List\033[0m")
-    students = Database.load_students()
-    if not students:
-        print("<Nothing to Display>")
-        return
-    for student in students:
-        print(f"ID: {student['id']}, Name: {student['name']}, Email: {student['email']}")
+def remove_student(student_id=None):
+    if student_id is None:
+        student_id = input("Enter student ID to remove: ")
+    if repository.remove(student_id):
+        print(f"\033[93mStudent (ID: {student_id}) removed.\033[0m")
+        return True
+    print(f"\033[91mStudent (ID: {student_id}) does not exist.\033[0m")
+    return False
+
+def show_students(format='text', limit=None, offset=0, after=None, **filters):
+    # filters: grades, name_prefix and email_domain, as for
+    # StudentRepository.query_students.
+    unpaged = limit is None and offset == 0 and after is None
+    with ReportWriter(format, ('id', 'name', 'email')) as report:
+        try:
+            if unpaged and all(value is None for value in filters.values()):
+                # The whole roster is streamed from the store, one student at
+                # a time, rather than queried and sorted in memory.
+                rows = ({'id': student['id'], 'name': student['name'], 'email': student['email']}
+                        for student in repository.iter_students())
+                total = next_after = None
+            else:
+                total, rows, next_after = query_page(limit, offset, after, **filters)
+        except ValueError as e:
+            report.error(str(e))
+            return False
+
+        if format == 'json':
+            if unpaged:
+                # The unpaged listing keeps its original shape.
+                report.json_array(rows)
+            else:
+                report.json({'total': total, 'students': rows, 'next_after': next_after})
+            return True
+
+        report.text("Student List", "93")
+        found = False
+        for student in rows:
+            found = True
+            report.record((student['id'], student['name'], student['email']),
+                          f"ID: {student['id']}, Name: {student['name']}, Email: {student['email']}")
+        if not found:
+            report.text("<Nothing to Display>")
+        if next_after is not None:
+            report.note(f"Showing {len(rows)} of {total}. Next page: --after {next_after}")
+    return True
 
 def university_system_menu():
     while True:
@@ -390,7 +2218,225 @@ def student_system_menu():
         else:
             print("\033[38;2;255;0;0mInvalid choice. Please try again.\033[0m")
 
+# Exit codes. argparse itself exits with 2 for bad arguments.
+EXIT_OK = 0
+EXIT_FAILURE = 1  # the command failed, or rejected some rows or operations
+EXIT_UNREADABLE = 3  # the input file of import, post-marks or batch could not be read
+
+def _print_json(data):
+    print(json.dumps(data, separators=(',', ':')))
+
+def _page_options(args):
+    return {'limit': args.limit, 'offset': args.offset, 'after': args.after, 'grades': args.grades,
+            'name_prefix': args.name_prefix, 'email_domain': args.email_domain}
+
+def _cli_show(args):
+    return EXIT_OK if show_students(args.format, **_page_options(args)) else EXIT_FAILURE
+
+def _cli_group(args):
+    return EXIT_OK if group_students(args.subject, args.format, **_page_options(args)) else EXIT_FAILURE
+
+def _cli_partition(args):
+    return EXIT_OK if partition_students(args.subject, args.format) else EXIT_FAILURE
+
+def _cli_remove(args):
+    if args.format == 'text':
+        return EXIT_OK if remove_student(args.id) else EXIT_FAILURE
+    if repository.remove(args.id):
+        _print_json({'removed': args.id})
+        return EXIT_OK
+    _print_json({'error': f"Student (ID: {args.id}) does not exist."})
+    return EXIT_FAILURE
+
+def _cli_clear(args):
+    if not args.yes:
+        message = "Refusing to clear the database without --yes."
+        if args.format == 'json':
+            _print_json({'error': message})
+        else:
+            print(f"\033[91m{message}\033[0m")
+        return EXIT_FAILURE
+    repository.clear()
+    if args.format == 'json':
+        _print_json({'cleared': True})
+    else:
+        print("\033[93mStudents data cleared.\033[0m")
+    return EXIT_OK
+
+def _report_rows(args, done_key, done, errors, fields):
+    if args.format == 'json':
+        _print_json({done_key: done, 'errors': [dict(zip(fields, error)) for error in errors]})
+    else:
+        for error in errors:
+            print("\033[91m" + ", ".join(f"{field}: {value}" for field, value in zip(fields, error)) + "\033[0m")
+        print(f"\033[93m{done_key.capitalize()}: {done}, rejected: {len(errors)}\033[0m")
+    return EXIT_FAILURE if errors else EXIT_OK
+
+def _unreadable(args, error):
+    # Report an input file that cannot be opened or read like any other
+    # error of the command. Errors about other files are not ours to report.
+    if error.filename != args.path:
+        raise error
+    message = f"Cannot read {args.path}: {error.strerror or error}"
+    if args.format == 'json':
+        _print_json({'error': message})
+    else:
+        print(f"\033[91m{message}\033[0m")
+    return EXIT_UNREADABLE
+
+def _cli_import(args):
+    try:
+        imported, errors = import_students(args.path)
+    except OSError as e:
+        return _unreadable(args, e)
+    return _report_rows(args, 'imported', imported, errors, ('line', 'email', 'reason'))
+
+def _parse_mark(text):
+    # Whole marks are stored as ints. Text that is not a number is passed on
+    # as it is, for post_marks to report against its row.
+    try:
+        mark = float(text)
+    except (TypeError, ValueError):
+        return text
+    return int(mark) if mark.is_integer() else mark
+
+def _cli_post_marks(args):
+    try:
+        with open(args.path, "r", newline="") as file:
+            rows = [(row.get('student_id'), row.get('subject_id'), _parse_mark(row.get('mark')))
+                    for row in csv.DictReader(file)]
+    except OSError as e:
+        return _unreadable(args, e)
+    applied, errors = post_marks(rows)
+    return _report_rows(args, 'applied', applied, errors, ('row', 'reason'))
+
+def _cli_batch(args):
+    try:
+        result = run_batch(args.path, args.interval)
+    except OSError as e:
+        return _unreadable(args, e)
+    if args.format == 'json':
+        result = dict(result, errors=[dict(zip(('line', 'email', 'reason'), error)) for error in result['errors']])
+        _print_json(result)
+    else:
+        for line, email, reason in result['errors']:
+            print(f"\033[91mline: {line}, email: {email}, reason: {reason}\033[0m")
+        print(f"\033[93m{result['operations']} operations, {result['applied']} applied in "
+              f"{result['seconds']:.3f}s ({result['ops_per_sec']:,.0f} ops/sec)\033[0m")
+    return EXIT_FAILURE if result['errors'] else EXIT_OK
+
+def _cli_export(args):
+    count = export_students(args.path, args.format)
+    print(f"Exported {count} students.", file=sys.stderr)
+    return EXIT_OK
+
+def _cli_migrate(args):
+    migrate(STORAGE[args.source_format](args.source), STORAGE[args.target_format](args.target))
+    return EXIT_OK
+
+def _count(text):
+    try:
+        value = int(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"expected a whole number of students, 0 or more, not {text!r}")
+    return value
+
+def _positive(text):
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a whole number, 1 or more, not {text!r}")
+    return value
+
+def _grade_range(text):
+    # "B" or an inclusive range such as "A-C", best grade first or last.
+    first, _, last = text.upper().partition("-")
+    last = last or first
+    if first not in GRADES or last not in GRADES or len(first) != 1 or len(last) != 1:
+        raise argparse.ArgumentTypeError(f"expected a grade or range of grades from {GRADES}, e.g. A-C")
+    low, high = sorted((GRADES.index(first), GRADES.index(last)))
+    return GRADES[low:high + 1]
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="uniapp", description="CLIUniApp. Run without arguments for the interactive menu.",
+        epilog=f"exit status: {EXIT_OK} success, {EXIT_FAILURE} failed or rejected some rows, 2 bad arguments, "
+               f"{EXIT_UNREADABLE} input file could not be read")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('--format', choices=('text', 'json'), default='text', help="output format (default: text)")
+    report = argparse.ArgumentParser(add_help=False)
+    report.add_argument('--format', choices=('text', 'csv', 'json'), default='text', help="output format (default: text)")
+    paging = argparse.ArgumentParser(add_help=False)
+    paging.add_argument('--limit', type=_count, default=None, help="show at most this many students")
+    paging.add_argument('--offset', type=_count, default=0, help="skip this many students first")
+    paging.add_argument('--after', metavar='EMAIL', default=None,
+                        help="start after this student, as printed at the end of the previous page")
+    paging.add_argument('--name-prefix', default=None, help="only names starting with this (any case)")
+    paging.add_argument('--email-domain', default=None, help="only emails at this domain")
+    paging.add_argument('--grades', type=_grade_range, default=None, metavar='RANGE',
+                        help="only these grades, e.g. B or A-C (for show: in any subject)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    admin = commands.add_parser('admin', help="admin operations")
+    actions = admin.add_subparsers(dest='action', required=True)
+    actions.add_parser('show', parents=[report, paging], help="list all students").set_defaults(handler=_cli_show)
+    group = actions.add_parser('group', parents=[report, paging], help="group students by grade in a subject")
+    group.add_argument('--subject', required=True)
+    group.set_defaults(handler=_cli_group)
+    partition = actions.add_parser('partition', parents=[report], help="split students into pass/fail in a subject")
+    partition.add_argument('--subject', required=True)
+    partition.set_defaults(handler=_cli_partition)
+    remove = actions.add_parser('remove', parents=[output], help="remove a student")
+    remove.add_argument('--id', required=True)
+    remove.set_defaults(handler=_cli_remove)
+    clear = actions.add_parser('clear', parents=[output], help="remove every student")
+    clear.add_argument('--yes', action='store_true', help="confirm clearing the database")
+    clear.set_defaults(handler=_cli_clear)
+
+    import_parser = commands.add_parser('import', parents=[output], help="register students from a CSV or JSONL file")
+    import_parser.add_argument('path')
+    import_parser.set_defaults(handler=_cli_import)
+    marks = commands.add_parser('post-marks', parents=[output],
+                                help="apply marks from a CSV file with student_id,subject_id,mark columns")
+    marks.add_argument('path')
+    marks.set_defaults(handler=_cli_post_marks)
+    batch = commands.add_parser('batch', parents=[output], help="replay a JSONL file of student operations")
+    batch.add_argument('path')
+    batch.add_argument('--interval', type=_positive, default=None,
+                       help="save after every N applied operations (default: once at the end)")
+    batch.set_defaults(handler=_cli_batch)
+    export = commands.add_parser('export', help="write all students to a CSV or JSONL file")
+    export.add_argument('path', nargs='?', default='-', help="output file, or - for stdout (default)")
+    export.add_argument('--format', choices=('csv', 'jsonl'), default='jsonl')
+    export.set_defaults(handler=_cli_export)
+    migrate = commands.add_parser('migrate', help="copy the roster between storage formats "
+                                                   "(default: students.data into a SQLite database)")
+    migrate.add_argument('--source', default="students.data")
+    migrate.add_argument('--target', default="students.db")
+    migrate.add_argument('--from', dest='source_format', choices=sorted(STORAGE), default='json')
+    migrate.add_argument('--to', dest='target_format', choices=sorted(STORAGE), default='sqlite')
+    migrate.set_defaults(handler=_cli_migrate)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        university_system_menu()
+        return EXIT_OK
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except BrokenPipeError:
+        # The reader went away (e.g. output piped into head); point stdout at
+        # devnull so the interpreter's final flush does not fail as well.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+
 Path("students.data").touch()
 
 if __name__ == "__main__":
-    university_system_menu()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -4,6 +4,8 @@ import json
 import re
 import random
 
+from CLIUniApp_gp4Cmp1 import verify_password
+
 class Subject:
     def __init__(self, name):
         self.id = name
@@ -76,7 +78,7 @@ class App:
         with open("students.data", "r") as file:
             students = json.load(file)
 
-        student = next((s for s in students if s['email'] == email and s['password'] == password), None)  # Find student by email and password
+        student = next((s for s in students if s['email'] == email and verify_password(s['password'], password)), None)  # Find student by email and password
 
         if student:
             self.current_student = student
@@ -1,30 +1,10 @@
 import tkinter as tk
-from tkinter import messagebox
-import json
+from tkinter import messagebox, ttk
+import io
 import re
-import random
-
-class Subject:
-    def __init__(self, name):
-        self.id = name
-        self.name = name
-        self.mark = random.randint(25, 100)
-        self.grade = self.assign_grade(self.mark)
-
-    @staticmethod
-    def assign_grade(mark):
-        if mark >= 90:
-            return 'A'
-        elif mark >= 80:
-            return 'B'
-        elif mark >= 70:
-            return 'C'
-        elif mark >= 60:
-            return 'D'
-        elif mark >= 50:
-            return 'E'
-        else:
-            return 'F'
+from contextlib import redirect_stdout
+
+from CLIUniApp_gp4Cmp1 import Student, authenticate, repository, update_student_data
 
 class App:
     def __init__(self):
@@ -34,19 +14,25 @@ class App:
         self.root.configure(bg="#eeba30")
         self.current_student = None
 
+        # Every screen is built once and stacked in the same place; moving
+        # between screens just raises one, so nothing is destroyed or rebuilt.
+        self.screens = {}
+        for name, build in (('login', self.build_login), ('home', self.build_home),
+                            ('enrollment', self.build_enrollment), ('subjects', self.build_subjects)):
+            screen = tk.Frame(self.root, bg="#eeba30")
+            screen.place(relx=0, rely=0, relwidth=1, relheight=1)
+            build(screen)
+            self.screens[name] = screen
+
         self.login_window()
 
-    def login_window(self):
-        self.clear_window()
-        
-        box = tk.LabelFrame(self.root, text='SIGN IN', bg="#eeba30", fg='#372e29', padx=20, pady=20, font='Helvetica 12 bold')
-        box.columnconfigure(0, weight=1)
-        box.columnconfigure(1, weight=3)
-        box.place(rely=0.5, relx=0.5, anchor='center')
+    def show_screen(self, name):
+        self.screens[name].tkraise()
 
-        box = tk.LabelFrame(self.root, text='SIGN IN', bg="#eeba30", fg='#372e29', padx=20, pady=20, font='Helvetica 12 bold')
+    def build_login(self, screen):
+        box = tk.LabelFrame(screen, text='SIGN IN', bg="#eeba30", fg='#372e29', padx=20, pady=20, font='Helvetica 12 bold')
         box.columnconfigure(0, weight=1)
-        box.columnconfigure (1, weight=3)
+        box.columnconfigure(1, weight=3)
         box.place(rely=0.5, relx=0.5, anchor='center')
 
         emailLbl = tk.Label(box, text="Email:", justify='left', fg='#372e29', font='Helvetica 12 bold', bg='#eeba30')
@@ -58,7 +44,6 @@ class App:
         self.emailText = tk.StringVar()
         self.emailField = tk.Entry(box, textvariable=self.emailText)
         self.emailField.grid(column=1, row=0, padx=5, pady=5)
-        self.emailField.focus()
 
         self.passwordTxt = tk.StringVar()
         self.passwordField = tk.Entry(box, textvariable=self.passwordTxt, show="*")
@@ -70,18 +55,18 @@ class App:
         cancelBtn = tk.Button(box, text='Cancel')
         cancelBtn.grid(column=1, row=2, sticky=tk.E, padx=5, pady=5)
 
+    def login_window(self):
+        self.emailText.set("")
+        self.passwordTxt.set("")
+        self.show_screen('login')
+        self.emailField.focus()
+
     def login(self):
         email = self.emailField.get()
         password = self.passwordField.get()
 
-        if not self.student_exists(email):  # Call the student_exists function as an instance method
-            messagebox.showerror("Error", "Invalid login credentials.")
-            return
-
-        with open("students.data", "r") as file:
-            students = json.load(file)
-
-        student = next((s for s in students if s['email'] == email and s['password'] == password), None)  # Find student by email and password
+        # Goes through the repository, so it works with every storage backend.
+        student = authenticate(email, password)
 
         if student:
             self.current_student = student
@@ -89,51 +74,39 @@ class App:
         else:
             messagebox.showerror("Error", "Invalid login credentials.")
 
-    def student_exists(self, email):
-        try:
-            with open("students.data", "r") as file:
-                students = json.load(file)
-            for student in students:
-                if isinstance(student, dict) and student.get('email') == email:
-                    return True
-            return False
-        except (json.JSONDecodeError, FileNotFoundError):
-            return False
-    
-    def home_window(self):
-            self.clear_window()
-
-            welcome_label = tk.Label(self.root, text="Welcome to UniApp", bg="#eeba30", fg='#372e29', font='Helvetica 16 bold')
-            welcome_label.pack(pady=20)
+    def build_home(self, screen):
+        welcome_label = tk.Label(screen, text="Welcome to UniApp", bg="#eeba30", fg='#372e29', font='Helvetica 16 bold')
+        welcome_label.pack(pady=20)
 
-            select_label = tk.Label(self.root, text="Please select:", bg="#eeba30", fg='#372e29', font='Helvetica 14')
-            select_label.pack(pady=10)
+        select_label = tk.Label(screen, text="Please select:", bg="#eeba30", fg='#372e29', font='Helvetica 14')
+        select_label.pack(pady=10)
 
-            button_box = tk.Frame(self.root, bg="#eeba30")
-            button_box.pack(pady=20)
+        button_box = tk.Frame(screen, bg="#eeba30")
+        button_box.pack(pady=20)
 
-            enroll_button = tk.Button(button_box, text="Enroll", command=self.enrollment_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
-            enroll_button.pack(side="top", pady=5)
+        enroll_button = tk.Button(button_box, text="Enroll", command=self.enrollment_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        enroll_button.pack(side="top", pady=5)
 
-            show_subjects_button = tk.Button(button_box, text="Show Enrollments", command=self.show_subjects, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
-            show_subjects_button.pack(side="top", pady=5)
+        show_subjects_button = tk.Button(button_box, text="Show Enrollments", command=self.show_subjects, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        show_subjects_button.pack(side="top", pady=5)
 
-            logout_button = tk.Button(button_box, text="Logout", command=self.logout, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
-            logout_button.pack(side="top", pady=5)
+        logout_button = tk.Button(button_box, text="Logout", command=self.logout, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        logout_button.pack(side="top", pady=5)
 
-    def enrollment_window(self):
-        self.clear_window()
+    def home_window(self):
+        self.show_screen('home')
 
-        subject_name_label = tk.Label(self.root, text="Please enter the subject you want to enroll", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+    def build_enrollment(self, screen):
+        subject_name_label = tk.Label(screen, text="Please enter the subject you want to enroll", bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         subject_name_label.pack(pady=20)
 
-        subject_name_frame = tk.Frame(self.root, bg="#eeba30")
+        subject_name_frame = tk.Frame(screen, bg="#eeba30")
         subject_name_frame.pack(pady=10)
 
         self.subject_entry = tk.Entry(subject_name_frame)
         self.subject_entry.pack(side="left", padx=5)
 
-        button_box = tk.Frame(self.root, bg="#eeba30")
+        button_box = tk.Frame(screen, bg="#eeba30")
         button_box.pack(pady=20)
 
         enroll_button = tk.Button(button_box, text="Enroll", command=self.enroll_subject, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
@@ -145,6 +118,11 @@ class App:
         back_to_home_button = tk.Button(button_box, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
         back_to_home_button.pack(side="left", padx=5)
 
+    def enrollment_window(self):
+        self.clear_subject_entry()
+        self.show_screen('enrollment')
+        self.subject_entry.focus()
+
     def clear_subject_entry(self):
             self.subject_entry.delete(0, tk.END)
 
@@ -155,26 +133,51 @@ class App:
             messagebox.showerror("Error", "Please enter a subject name.")
             return
 
-        subject = Subject(subject_name)
-
-        if 'subjects' not in self.current_student:
-            self.current_student['subjects'] = []
-
-        if len(self.current_student['subjects']) >= 4:
+        if len(self.current_student.get('subjects', [])) >= 4:
         # Check if the maximum number of subjects has been reached
             messagebox.showerror("Error", "Cannot enroll in more than 4 subjects.")
             return
 
-        self.current_student['subjects'].append(subject.__dict__)
-
-        with open("students.data", "w") as file:
-            json.dump(self.current_student, file)
-
-        messagebox.showinfo("Success", f"Subject '{subject_name}' enrolled successfully.")
+        # Enrol on the latest stored copy through the shared store, which
+        # locks, checks the record version and writes atomically, so changes
+        # saved by other sessions are kept.
+        record = repository.get_by_email(self.current_student['email'])
+        if record is None:
+            messagebox.showerror("Error", "Student no longer exists.")
+            return
+        student = Student(**record)
+        if len(student.subjects) >= 4:
+            error = "Cannot enroll in more than 4 subjects."
+        elif any(subject.name == subject_name for subject in student.subjects):
+            error = "Subject already enrolled."
+        else:
+            error = None
+            with redirect_stdout(io.StringIO()):
+                student.enroll_subject(subject_name)
+                student = update_student_data(student, lambda latest: latest.enroll_subject(subject_name))
+        self.current_student = student.to_dict()
+
+        if error:
+            messagebox.showerror("Error", error)
+        else:
+            messagebox.showinfo("Success", f"Subject '{subject_name}' enrolled successfully.")
+
+    def build_subjects(self, screen):
+        # One Treeview holds the whole list; showing it again only swaps the
+        # rows, never the widgets.
+        self.subject_list = ttk.Treeview(screen, columns=('subject', 'mark', 'grade'), show='headings', height=8)
+        self.subject_list.heading('subject', text="Subject")
+        self.subject_list.heading('mark', text="Mark")
+        self.subject_list.heading('grade', text="Grade")
+        self.subject_list.column('subject', width=200, anchor="w")
+        self.subject_list.column('mark', width=80, anchor="center")
+        self.subject_list.column('grade', width=80, anchor="center")
+        self.subject_list.pack(pady=30, padx=20, fill=tk.BOTH, expand=True)
+
+        back_button = tk.Button(screen, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
+        back_button.pack(pady=20)
 
     def show_subjects(self):
-        self.clear_window()
-
         subjects = self.current_student.get('subjects', [])
 
         if not subjects:
@@ -186,36 +189,15 @@ class App:
                 self.enrollment_window()
             return
 
-        subject_list = tk.Listbox(self.root, width=40)
-        subject_list.pack(pady=30)
-
+        self.subject_list.delete(*self.subject_list.get_children())
         for subject in subjects:
-            subject_text = f"Subject: {subject['name']}"
-            mark_text = f"Mark: {subject['mark']}"
-            grade_text = f"Grade: {subject['grade']}"
-
-            subject_label = tk.Label(subject_list, text=subject_text, anchor="w")
-            subject_label.pack(fill=tk.X, expand=True)
-
-            mark_label = tk.Label(subject_list, text=mark_text, anchor="w")
-            mark_label.pack(fill=tk.X, expand=True)
+            self.subject_list.insert('', tk.END, values=(subject['name'], subject['mark'], subject['grade']))
+        self.show_screen('subjects')
 
-            grade_label = tk.Label(subject_list, text=grade_text, anchor="w")
-            grade_label.pack(fill=tk.X, expand=True)
-
-            subject_list.pack(fill=tk.BOTH, expand=True)
-
-        back_button = tk.Button(self.root, text="Back to Home", command=self.home_window, bg="#eeba30", fg='#372e29', font='Helvetica 12 bold')
-        back_button.pack(pady=20)
-  
     def logout(self):
         self.current_student = None
         self.login_window()
 
-    def clear_window(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
-
     def run(self):
         self.root.mainloop()
 
@@ -0,0 +1,320 @@
+"""Benchmarks for the CLIUniApp storage and model layers.
+
+Run ``python benchmark.py <benchmark> [--count N]``; each benchmark prints
+its own results.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import CLIUniApp_gp4Cmp1 as uniapp
+import validation
+
+LOGIN_COSTS = (10000, 50000, 100000, 200000, 600000)
+SUBJECT_NAMES = ['Math', 'Physics', 'Chemistry', 'Biology', 'History', 'Art', 'Music', 'English']
+
+
+def make_roster(count, seed=0):
+    rng = random.Random(seed)
+    students = []
+    for number in range(1, count + 1):
+        subjects = []
+        for position, name in enumerate(rng.sample(SUBJECT_NAMES, rng.randint(0, 4)), start=1):
+            mark = rng.randint(25, 100)
+            subjects.append({'id': str(position).zfill(3), 'name': name, 'mark': mark,
+                             'grade': uniapp.Subject.assign_grade(mark)})
+        students.append({'id': str(number).zfill(6), 'name': f"Student {number}",
+                         'email': f"student{number}@university.com", 'password': f"Password{number:03d}",
+                         'subjects': subjects, 'version': 0})
+    return students
+
+
+def traced_size(build):
+    # Memory still held by whatever build() returns, once its temporaries
+    # have been freed.
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def hydrated(record):
+    student = uniapp.Student(**record)
+    student.subjects
+    return student
+
+
+def bench_models(count):
+    text = json.dumps(make_roster(count))
+    enrolments = sum(len(student['subjects']) for student in json.loads(text))
+    # Every representation is decoded from the same JSON so each one pays
+    # for its own strings.
+    _, dict_size = traced_size(lambda: json.loads(text))
+    # Students only build their Subjects when first used, so they are
+    # measured both as loaded and with the subjects in use.
+    _, object_size = traced_size(lambda: [uniapp.Student(**student) for student in json.loads(text)])
+    _, hydrated_size = traced_size(lambda: [hydrated(student) for student in json.loads(text)])
+    batch, batch_size = traced_size(lambda: uniapp.RosterBatch.from_dicts(json.loads(text)))
+    assert list(batch.to_dicts()) == json.loads(text)
+
+    print(f"{count} students, {enrolments} enrolments")
+    for label, size in (("dicts", dict_size), ("Students, lazy", object_size),
+                        ("Students, subjects", hydrated_size), ("RosterBatch", batch_size)):
+        print(f"  {label:<18} {size / 1e6:8.2f} MB  {size / count:7.1f} B/student  "
+              f"{size / dict_size:5.2f}x dicts")
+
+
+def bench_save(count):
+    # Reload a roster, change one student and save it again, against a
+    # plain json.dump of the same list.
+    with tempfile.TemporaryDirectory() as scratch:
+        database = uniapp.Database(os.path.join(scratch, "students.data"))
+        database.save_students(make_roster(count))
+        started = time.perf_counter()
+        students = database.load_students()
+        loaded = time.perf_counter() - started
+        students[count // 2] = dict(students[count // 2], name="Renamed", version=1)
+        started = time.perf_counter()
+        with open(os.path.join(scratch, "plain.data"), "w") as file:
+            json.dump(students, file, indent=4)
+        plain = time.perf_counter() - started
+        started = time.perf_counter()
+        database.save_students(students)
+        saved = time.perf_counter() - started
+        with open(database.path) as ours, open(os.path.join(scratch, "plain.data")) as theirs:
+            assert ours.read() == theirs.read()
+
+    print(f"{count} students, one changed")
+    print(f"  load_students       {loaded:8.3f} s")
+    print(f"  json.dump           {plain:8.3f} s")
+    print(f"  save_students       {saved:8.3f} s")
+
+
+def bench_snapshot(count):
+    # Size and load time of the same roster as indented JSON and as a
+    # binary snapshot, plus one student looked up by email through mmap.
+    students = make_roster(count)
+    with tempfile.TemporaryDirectory() as scratch:
+        json_store = uniapp.Database(os.path.join(scratch, "students.data"))
+        snapshot_store = uniapp.SnapshotDatabase(os.path.join(scratch, "students.snap"))
+        json_store.save_students(students)
+        snapshot_store.save_students(students)
+        print(f"{count} students")
+        for label, store in (("JSON", json_store), ("snapshot", snapshot_store)):
+            started = time.perf_counter()
+            assert store.load_students() == students
+            seconds = time.perf_counter() - started
+            print(f"  {label:<9} {os.path.getsize(store.path) / 1e6:8.2f} MB  load {seconds:7.3f} s")
+        email = students[count // 2]['email']
+        started = time.perf_counter()
+        assert snapshot_store.find_student(email) == students[count // 2]
+        print(f"  snapshot find_student {(time.perf_counter() - started) * 1e6:8.0f} us")
+
+
+def bench_grading(count):
+    rng = random.Random(0)
+    marks = [rng.randint(0, 100) for _ in range(count)]
+    started = time.perf_counter()
+    one_by_one = [uniapp.Subject.assign_grade(mark) for mark in marks]
+    scalar = time.perf_counter() - started
+    started = time.perf_counter()
+    codes = uniapp.assign_grades(marks)
+    batched = time.perf_counter() - started
+    assert [uniapp.GRADES[code] for code in codes] == one_by_one
+
+    backend = "numpy" if uniapp.numpy is not None else "pure Python"
+    print(f"{count} marks")
+    print(f"  Subject.assign_grade  {count / scalar:14,.0f} marks/s")
+    print(f"  assign_grades ({backend}) {count / batched:14,.0f} marks/s")
+
+
+def bench_logins(count):
+    # Cold logins pay for the full hash; warm ones are answered by the
+    # verification cache. UNIAPP_PASSWORD_ITERATIONS picks the cost.
+    print(f"PBKDF2-SHA256 login rate (configured cost: {uniapp.PASSWORD_ITERATIONS} iterations)")
+    for iterations in LOGIN_COSTS:
+        stored = uniapp.hash_password("Password123", iterations)
+        logins = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < 1.0:
+            uniapp.verification_cache.clear()
+            assert uniapp.verify_password(stored, "Password123")
+            logins += 1
+        cold = logins / (time.perf_counter() - started)
+        started = time.perf_counter()
+        for _ in range(count):
+            uniapp.verify_password(stored, "Password123")
+        warm = count / (time.perf_counter() - started)
+        print(f"  {iterations:>7} iterations  {cold:8,.1f} logins/s  {warm:12,.0f} cached logins/s")
+
+
+def make_credentials(count, seed=0):
+    # Roughly a third of each kind of mistake next to valid pairs.
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    credentials = []
+    for number in range(count):
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        digits = str(rng.randint(0, 99999))
+        password = rng.choice((word.capitalize() + digits, word + digits, word.capitalize(), "A" + digits))
+        domain = rng.choice(("university.com", "university.com", "example.com"))
+        credentials.append((f"student{number}@{domain}", password))
+    return credentials
+
+
+def legacy_validate_email(email):
+    return re.match(r"[^@]+@university.com", email) is not None
+
+
+def legacy_validate_password(password):
+    # validate_password as it was before validation.py, kept as the baseline.
+    pattern = r"^[A-Z][a-zA-Z]{5,}[0-9]{3,}$"
+    match = re.match(pattern, password)
+    if match:
+        return True
+    else:
+        print("\033[91mPassword format is invalid.\033[0m")
+        if not re.match(r"^[A-Z]", password):
+            print("\033[91mPassword does not start with an uppercase letter.\033[0m")
+        if not re.match(r"^[A-Z][a-zA-Z]{5,}", password):
+            print("\033[91mPassword does not have at least 5 letters after the initial uppercase letter.\033[0m")
+        if not re.match(r"^[A-Z][a-zA-Z]{5,}[0-9]{3,}$", password):
+            print("\033[91mPassword does not end with at least 3 digits.\033[0m")
+        return False
+
+
+def bench_validation(count):
+    credentials = make_credentials(count)
+    with open(os.devnull, "w") as sink, redirect_stdout(sink):
+        started = time.perf_counter()
+        legacy = [legacy_validate_email(email) and legacy_validate_password(password)
+                  for email, password in credentials]
+        legacy_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    results = list(validation.validate_many(credentials))
+    seconds = time.perf_counter() - started
+    assert [not reasons for reasons in results] == legacy
+
+    print(f"{count} credentials, {legacy.count(True)} valid")
+    print(f"  legacy validate_email/validate_password {count / legacy_seconds:12,.0f} credentials/s")
+    print(f"  validation.validate_many                {count / seconds:12,.0f} credentials/s")
+
+
+def bench_report(count):
+    # A pass/fail report of count students written to a file, one print()
+    # per line as before against ReportWriter.
+    students = [{'id': str(number).zfill(6), 'name': f"Student {number}"} for number in range(count)]
+    with tempfile.TemporaryDirectory() as scratch:
+        timings = {}
+        for label in ("print", "ReportWriter"):
+            path = os.path.join(scratch, label)
+            with open(path, "w") as file:
+                started = time.perf_counter()
+                if label == "print":
+                    with redirect_stdout(file):
+                        print("Pass Students in Math:")
+                        for student in students:
+                            print(f"  ID: {student['id']}, Name: {student['name']}")
+                else:
+                    with uniapp.ReportWriter(stream=file) as report:
+                        report.text("Pass Students in Math:")
+                        for student in students:
+                            report.record(('pass', student['id'], student['name']),
+                                          f"  ID: {student['id']}, Name: {student['name']}")
+                timings[label] = time.perf_counter() - started
+        with open(os.path.join(scratch, "print")) as ours, open(os.path.join(scratch, "ReportWriter")) as theirs:
+            assert ours.read() == theirs.read()
+
+    print(f"{count} report lines to a file")
+    for label, seconds in timings.items():
+        print(f"  {label:<13} {seconds:8.3f} s  {count / seconds:12,.0f} lines/s")
+
+
+async def _request(reader, writer, path, body):
+    data = json.dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = await reader.readline()
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode('latin-1').partition(":")
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status.split()[1])
+
+
+async def _drive_server(count, clients=16):
+    import uniapp_server
+
+    service = uniapp_server.StudentService()
+    await service.start(port=0)
+    port = service.server.sockets[0].getsockname()[1]
+    connections = [await asyncio.open_connection('127.0.0.1', port) for _ in range(clients)]
+    credentials = [{'name': f"Student {n}", 'email': f"student{n}@university.com",
+                    'password': f"Password{n:03d}"} for n in range(count)]
+
+    async def run(path, client):
+        reader, writer = connections[client]
+        for body in credentials[client::clients]:
+            assert await _request(reader, writer, path, body) in (200, 201)
+
+    timings = {}
+    for path in ('/register', '/login'):
+        started = time.perf_counter()
+        await asyncio.gather(*(run(path, client) for client in range(clients)))
+        timings[path] = time.perf_counter() - started
+    for _, writer in connections:
+        writer.close()
+    await service.close()
+    return timings
+
+
+def bench_server(count):
+    # Registrations go through the group-committing writer; logins are
+    # answered from the server's cache. Runs against a throwaway store.
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            timings = asyncio.run(_drive_server(count))
+        finally:
+            os.chdir(cwd)
+    print(f"{count} requests per endpoint, 16 keep-alive clients")
+    for path, seconds in timings.items():
+        print(f"  {path:<10} {count / seconds:10,.0f} req/s")
+
+
+BENCHMARKS = {
+    'grading': bench_grading,
+    'logins': bench_logins,
+    'models': bench_models,
+    'report': bench_report,
+    'save': bench_save,
+    'server': bench_server,
+    'snapshot': bench_snapshot,
+    'validation': bench_validation,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args.count)
+
+
+if __name__ == "__main__":
+    main()
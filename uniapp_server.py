@@ -0,0 +1,322 @@
+"""Local HTTP/JSON service over the CLIUniApp student store.
+
+One process holds the roster in memory (through the shared
+StudentRepository) and answers every client, instead of each GUI and CLI
+session parsing students.data itself. Reads are served straight from the
+cache; writes are queued to a single writer task that applies everything
+queued so far in one batched, locked write. Store access runs in worker
+threads so a slow commit never holds up the event loop.
+
+    python uniapp_server.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints (JSON bodies and responses):
+    POST /login           {"email", "password"} -> the student and a "token"
+    POST /register        {"name", "email", "password"}
+    POST /enrol           {"token", "subject"}
+    POST /remove-subject  {"token", "subject_id"}
+    GET  /admin/group?subject=NAME
+    GET  /admin/partition?subject=NAME
+"""
+import argparse
+import asyncio
+import io
+import json
+import secrets
+import sys
+import time
+import traceback
+from contextlib import redirect_stdout
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import CLIUniApp_gp4Cmp1 as uniapp
+import validation
+
+# How long a login token stays valid, in seconds.
+SESSION_SECONDS = 3600
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def public(student):
+    return {key: value for key, value in student.items() if key != 'password'}
+
+
+def require(body, *fields):
+    missing = [field for field in fields if not isinstance(body.get(field), str) or not body[field]]
+    if missing:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"Missing field(s): {', '.join(missing)}")
+    return [body[field] for field in fields]
+
+
+def quietly(action):
+    # Run a model method that reports through print() and return its result
+    # with the last message it printed, minus the terminal colours.
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = action()
+    lines = uniapp.ANSI_ESCAPE.sub("", output.getvalue()).strip().splitlines()
+    return result, lines[-1] if lines else ""
+
+
+class StudentService:
+    def __init__(self, repository=None):
+        self.repository = repository if repository is not None else uniapp.repository
+        self.server = None
+        self._writes = None
+        self._writer = None
+        self._clients = {}
+        # Login token -> (email, expiry on the monotonic clock).
+        self.sessions = {}
+        self.routes = {
+            ('POST', '/login'): self.login,
+            ('POST', '/register'): self.register,
+            ('POST', '/enrol'): self.enrol,
+            ('POST', '/remove-subject'): self.remove_subject,
+            ('GET', '/admin/group'): self.group,
+            ('GET', '/admin/partition'): self.partition,
+        }
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self._writes = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients)
+        await self.server.wait_closed()
+        self._writer.cancel()
+
+    async def _write_loop(self):
+        # The only place the store is written. Everything queued while the
+        # previous batch was being written goes out as one group commit, and
+        # callers hear back only after it is on disk.
+        while True:
+            jobs = [await self._writes.get()]
+            while not self._writes.empty():
+                jobs.append(self._writes.get_nowait())
+            outcomes = await asyncio.to_thread(self._commit, jobs)
+            for future, result, error in outcomes:
+                if future.cancelled():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _commit(self, jobs):
+        # Runs in a worker thread. A job that fails only fails its own
+        # request: the jobs before it are still written when the batch ends.
+        outcomes = []
+        try:
+            with self.repository.batch():
+                for job, future in jobs:
+                    try:
+                        outcomes.append((future, job(), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            outcomes = [(future, None, e) for _, future in jobs]
+        return outcomes
+
+    async def read(self, action):
+        # Reads take the store's shared lock in a worker thread, so they wait
+        # for a commit in progress without blocking the event loop.
+        def locked():
+            with self.repository.lock.shared():
+                return action()
+
+        return await asyncio.to_thread(locked)
+
+    async def write(self, job):
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put((job, future))
+        return await future
+
+    async def login(self, body, query):
+        # Password hashing runs in worker threads so a slow hash never holds
+        # up other clients.
+        email, password = require(body, 'email', 'password')
+        student = await self.read(lambda: self.repository.get_by_email(email))
+        if student is None or not await asyncio.to_thread(uniapp.verify_password, student['password'], password):
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Invalid login credentials.")
+        if uniapp.password_needs_rehash(student['password']):
+            stored = student['password']
+            hashed = await asyncio.to_thread(uniapp.hash_password, password)
+
+            def job():
+                latest = self.repository.get_by_email(email)
+                if latest is not None and latest['password'] == stored:
+                    latest = dict(latest, password=hashed)
+                    self.repository.update(latest)
+                return latest
+
+            student = await self.write(job) or student
+        return HTTPStatus.OK, dict(public(student), token=self._start_session(email))
+
+    def _start_session(self, email):
+        now = time.monotonic()
+        for token, (_, expires) in list(self.sessions.items()):
+            if expires <= now:
+                del self.sessions[token]
+        token = secrets.token_urlsafe(32)
+        self.sessions[token] = (email, now + SESSION_SECONDS)
+        return token
+
+    def _session_email(self, token):
+        # The email a login token was issued for; only that student's
+        # enrolments can be changed with it.
+        session = self.sessions.get(token)
+        if session is None or session[1] <= time.monotonic():
+            self.sessions.pop(token, None)
+            raise HTTPError(HTTPStatus.UNAUTHORIZED, "Log in first: missing or expired token.")
+        return session[0]
+
+    async def register(self, body, query):
+        name, email, password = require(body, 'name', 'email', 'password')
+        reasons = validation.check_email(email) + validation.check_password(password)
+        if reasons:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, " ".join(validation.MESSAGES[reason] for reason in reasons))
+        hashed = await asyncio.to_thread(uniapp.hash_password, password)
+
+        def job():
+            student = uniapp.Student(id=self.repository.allocate_student_id(), name=name, email=email,
+                                     password=hashed).to_dict()
+            if not self.repository.add(student):
+                raise HTTPError(HTTPStatus.CONFLICT, "Student already registered.")
+            return student
+
+        return HTTPStatus.CREATED, public(await self.write(job))
+
+    async def enrol(self, body, query):
+        token, subject_name = require(body, 'token', 'subject')
+        email = self._session_email(token)
+        return HTTPStatus.OK, await self.write(
+            lambda: self._change(email, lambda student: student.enroll_subject(subject_name)))
+
+    async def remove_subject(self, body, query):
+        token, subject_id = require(body, 'token', 'subject_id')
+        email = self._session_email(token)
+        return HTTPStatus.OK, await self.write(
+            lambda: self._change(email, lambda student: student.remove_subject(subject_id)))
+
+    def _change(self, email, action):
+        # Runs on the writer thread, which holds the store's exclusive lock for
+        # the whole batch, so the record read here cannot go stale.
+        record = self.repository.get_by_email(email)
+        if record is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Student does not exist.")
+        student = uniapp.Student(**record)
+        done, message = quietly(lambda: action(student))
+        if not done:
+            raise HTTPError(HTTPStatus.CONFLICT, message)
+        record = student.to_dict()
+        self.repository.update(record)
+        return public(record)
+
+    async def group(self, body, query):
+        subject = self._subject(query)
+        grade_groups = await self.read(lambda: self.repository.group_students(subject))
+        if grade_groups is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Invalid subject: {subject}")
+        return HTTPStatus.OK, {'subject': subject, 'grades': grade_groups}
+
+    async def partition(self, body, query):
+        subject = self._subject(query)
+        partition = await self.read(lambda: self.repository.partition_students(subject))
+        if partition is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Invalid subject: {subject}")
+        return HTTPStatus.OK, {'subject': subject, 'pass': partition[0], 'fail': partition[1]}
+
+    @staticmethod
+    def _subject(query):
+        subject = query.get('subject', [''])[0]
+        if not subject:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Missing query parameter: subject")
+        return subject
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        route = self.routes.get((method, url.path))
+        if route is None:
+            return HTTPStatus.NOT_FOUND, {'error': f"No route for {method} {url.path}"}
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object.")
+            return await route(payload, parse_qs(url.query))
+        except json.JSONDecodeError:
+            return HTTPStatus.BAD_REQUEST, {'error': "Request body is not valid JSON."}
+        except HTTPError as e:
+            return e.status, {'error': e.message}
+        except Exception:
+            # Keep the connection usable and tell the client; the details go
+            # to the server's stderr.
+            traceback.print_exc(file=sys.stderr)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal server error."}
+
+    async def _handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive, which is all local clients need.
+        self._clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self._dispatch(method, target, body)
+                data = json.dumps(payload, separators=(',', ':')).encode()
+                keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            del self._clients[asyncio.current_task()]
+            writer.close()
+
+
+async def serve(host, port):
+    service = StudentService()
+    server = await service.start(host, port)
+    print(f"Serving CLIUniApp on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default="127.0.0.1", help="address to bind (default: localhost only)")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Email and password rules for CLIUniApp.
+
+The checks here never print: they return failure codes, and MESSAGES maps
+each code to the text shown to students. An empty result means the value
+is valid.
+
+    check_password("abc")      -> ('password-uppercase', 'password-letters', 'password-digits')
+    check_email("a@university.com") -> ()
+"""
+import re
+
+EMAIL_FORMAT = 'email-format'
+PASSWORD_UPPERCASE = 'password-uppercase'
+PASSWORD_LETTERS = 'password-letters'
+PASSWORD_DIGITS = 'password-digits'
+
+MESSAGES = {
+    EMAIL_FORMAT: "Invalid email format.",
+    PASSWORD_UPPERCASE: "Password does not start with an uppercase letter.",
+    PASSWORD_LETTERS: "Password does not have at least 5 letters after the initial uppercase letter.",
+    PASSWORD_DIGITS: "Password does not end with at least 3 digits.",
+}
+
+EMAIL_PATTERN = re.compile(r"[^@]+@university.com")
+# A valid password is an uppercase letter, at least five letters and at least
+# three digits. Splitting any string into those runs (each possibly empty)
+# tells every rule it breaks from one match. The rest may be a lone newline,
+# as "$" allows.
+PASSWORD_PATTERN = re.compile(r"([A-Z]?)([a-zA-Z]*)([0-9]*)(.*)", re.DOTALL)
+
+_PASSWORD_FAILURES = (PASSWORD_UPPERCASE, PASSWORD_LETTERS, PASSWORD_DIGITS)
+
+
+def check_email(email):
+    return () if EMAIL_PATTERN.match(email) else (EMAIL_FORMAT,)
+
+
+def check_password(password):
+    upper, letters, digits, rest = PASSWORD_PATTERN.match(password).groups()
+    if not upper:
+        return _PASSWORD_FAILURES
+    if len(letters) < 5:
+        return _PASSWORD_FAILURES[1:]
+    if len(digits) < 3 or rest not in ("", "\n"):
+        return _PASSWORD_FAILURES[2:]
+    return ()
+
+
+def is_valid_email(email):
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def is_valid_password(password):
+    return not check_password(password)
+
+
+def validate_many(credentials):
+    # Check (email, password) pairs in bulk, e.g. for an import job. Yields
+    # the failure codes for each pair in order, an empty tuple when both
+    # are valid.
+    email_match = EMAIL_PATTERN.match
+    for email, password in credentials:
+        reasons = check_password(password)
+        if email_match(email) is None:
+            reasons = (EMAIL_FORMAT,) + reasons
+        yield reasons